@@ -0,0 +1,420 @@
+"""Benchmark das operações do validador, para comparar commits.
+
+Uso:
+    python benchmark.py --linhas 10000 100000 1000000
+    python benchmark.py --linhas 100000 --latencia 50 --taxa-erro 0.05 --app --saida bench.jsonl
+
+Monta a base a partir do dados.csv (ou de uma base sintética com --sintetico),
+replicada até o número de linhas pedido com as URLs trocadas por um servidor
+de imagens falso local (JPEG/PNG gerados, com latência e taxa de erro
+configuráveis). Mede tempo e memória de cada operação: pico do tracemalloc
+(Python e numpy) e, à parte, quanto a memória do Arrow cresceu (onde o
+pandas guarda as colunas de texto, invisível ao tracemalloc). Operações:
+carregamento, índices, próxima pendente (no arquivo e numa fila filtrada),
+contagem de duplicatas, save com replicação, exportação, download +
+decodificação e extração de características. Com --app, também roda o
+streamlit_app.py sem navegador (AppTest) e mede rerun e "Salvar e Avançar".
+Com --saida, cada resultado vira uma linha JSON com o commit atual.
+"""
+import argparse
+import hashlib
+import http.server
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from io import BytesIO
+
+# Os módulos leem os caminhos de cache/diário na importação: o benchmark usa
+# um diretório temporário próprio, sem tocar nos dados do app
+_TEMP = tempfile.mkdtemp(prefix="validador_bench_")
+os.environ["VALIDADOR_CACHE_DIR"] = os.path.join(_TEMP, "cache")
+os.environ["VALIDADOR_DIARIO"] = os.path.join(_TEMP, "diario.sqlite3")
+os.environ["VALIDADOR_HASHES"] = os.path.join(_TEMP, "hashes.sqlite3")
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+import caracteristicas
+from cache_imagens import CacheDisco
+from carregador import ler_planilha, preparar_colunas
+from diario import DiarioValidacao, GravacaoSegundoPlano, gravar_decisao
+from exportacao import FORMATOS, serializar
+from imagens import PreBuscaImagens, buscar_imagem, carregar_imagem, detectar_coluna_url
+from indices import EstadoValidacao, FilaRevisao, IndiceGrupos, IndicesFiltro
+
+DIRETORIO = os.path.dirname(os.path.abspath(__file__))
+DADOS_PADRAO = os.path.join(DIRETORIO, "dados.csv")
+
+# Imagens distintas geradas pelo servidor falso, por formato
+VARIACOES_IMAGEM = 16
+TAMANHO_IMAGEM = (1200, 1600)
+
+
+def _gerar_imagem(semente, formato):
+    rng = np.random.default_rng(semente)
+    largura, altura = TAMANHO_IMAGEM
+    gradiente = np.linspace(0, 255, largura, dtype=np.float32)[None, :, None]
+    cor = rng.integers(0, 256, size=3).astype(np.float32)
+    pixels = (gradiente * 0.5 + cor * 0.5 + rng.normal(0, 12, size=(altura, largura, 3))).clip(0, 255)
+    buffer = BytesIO()
+    img = Image.fromarray(pixels.astype(np.uint8), "RGB")
+    if formato == "PNG":
+        img.save(buffer, "PNG", compress_level=1)
+    else:
+        img.save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+class _ImagensFalsas(http.server.BaseHTTPRequestHandler):
+    latencia = 0.0
+    taxa_erro = 0.0
+    imagens = {}
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.latencia:
+            time.sleep(self.latencia)
+        # Erros e imagem escolhidos pelo caminho: a mesma URL sempre responde igual
+        sorteio = int(hashlib.sha256(self.path.encode()).hexdigest()[:8], 16)
+        if (sorteio % 10_000) / 10_000 < self.taxa_erro:
+            self.send_error(500 if sorteio % 2 else 404)
+            return
+        formato = "PNG" if self.path.endswith(".png") else "JPEG"
+        corpo = self.imagens[formato][sorteio % VARIACOES_IMAGEM]
+        self.send_response(200)
+        self.send_header("Content-Type", f"image/{formato.lower()}")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+
+def iniciar_servidor(latencia_ms=0, taxa_erro=0.0):
+    """Sobe o servidor falso numa thread e retorna (servidor, url_base)."""
+    handler = type("Handler", (_ImagensFalsas,), {
+        "latencia": latencia_ms / 1000,
+        "taxa_erro": taxa_erro,
+        "imagens": {f: [_gerar_imagem(i, f) for i in range(VARIACOES_IMAGEM)] for f in ("JPEG", "PNG")},
+    })
+    servidor = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f"http://127.0.0.1:{servidor.server_address[1]}/"
+
+
+def base_sintetica(linhas=5000, semente=0):
+    """Base no formato do dados.csv, com ~1/3 das linhas repetindo URL + Categoria."""
+    rng = np.random.default_rng(semente)
+    codigos = rng.integers(0, int(linhas * 0.65), size=linhas)
+    return pd.DataFrame({
+        "URL_Imagem": [f"https://exemplo/media/{c}.jpg" for c in codigos],
+        "Categoria": rng.choice(["Papel Higiênico", "Papel Toalha", "Guardanapos"], size=linhas),
+        "Data": pd.Timestamp("2025-11-01") + pd.to_timedelta(rng.integers(0, 30, size=linhas), unit="D"),
+        "CNPJ": rng.integers(10**13, 10**14, size=linhas).astype(str),
+    })
+
+
+def montar_dados(base, linhas, url_base):
+    """Replica a base até `linhas`, trocando as URLs pelas do servidor falso.
+
+    Cada cópia ganha URLs próprias, então a proporção de duplicatas da base
+    se mantém em qualquer escala.
+    """
+    col_url = detectar_coluna_url(base)
+    codigos, _ = pd.factorize(base[col_url])
+    unicas = int(codigos.max()) + 1
+    copias = -(-linhas // len(base))
+    origem = np.tile(np.arange(len(base)), copias)[:linhas]
+    copia = np.repeat(np.arange(copias), len(base))[:linhas]
+    df = base.iloc[origem].reset_index(drop=True)
+    imagem = codigos[origem] + copia * unicas
+    extensao = np.where(imagem % 5 == 0, ".png", ".jpg")
+    df[col_url] = url_base + "img/" + imagem.astype(str) + extensao
+    return df
+
+
+def medir(nome, funcao, repeticoes=1):
+    """Roda `funcao` `repeticoes` vezes cronometrando e mais uma sob tracemalloc.
+
+    Retorna (dict do resultado, retorno da primeira execução).
+    """
+    inicio = time.perf_counter()
+    retorno = funcao()
+    for _ in range(repeticoes - 1):
+        funcao()
+    total = time.perf_counter() - inicio
+
+    arrow_antes = pyarrow.total_allocated_bytes() if pyarrow else 0
+    tracemalloc.start()
+    guardado = funcao()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    arrow = (pyarrow.total_allocated_bytes() - arrow_antes) if pyarrow else 0
+    del guardado
+    return {
+        "operacao": nome,
+        "repeticoes": repeticoes,
+        "total_s": round(total, 4),
+        "ms_por_op": round(total / repeticoes * 1000, 4),
+        "pico_mb": round(pico / 2**20, 2),
+        "arrow_mb": round(arrow / 2**20, 2),
+    }, retorno
+
+
+def medir_nucleo(df_origem, caminho_csv, amostras, semente):
+    """Operações do app sobre os índices e o DataFrame, sem Streamlit."""
+    resultados = []
+    df_origem.to_csv(caminho_csv, index=False, sep=";", encoding="utf-8-sig", date_format="%d/%m/%Y")
+
+    def carregar():
+        return preparar_colunas(ler_planilha(caminho_csv, caminho_csv))
+
+    r, df = medir("carregamento", carregar)
+    resultados.append(r)
+    col_url = detectar_coluna_url(df)
+
+    r, (grupos, estado) = medir("indices", lambda: (IndiceGrupos(df, col_url, "Categoria"), EstadoValidacao(df["Valida"])))
+    resultados.append(r)
+
+    # Metade da base já validada, espalhada
+    rng = np.random.default_rng(semente)
+    estado.marcar(np.flatnonzero(rng.random(len(df)) < 0.5), "SIM")
+    posicoes = rng.integers(0, len(df), size=amostras)
+
+    fila_completa = FilaRevisao(np.arange(len(df)), estado)
+
+    def proximas():
+        for p in posicoes:
+            fila_completa.proxima_pendente(int(p))
+
+    r, _ = medir("proxima_pendente", proximas)
+    r.update(repeticoes=amostras, ms_por_op=round(r["total_s"] / amostras * 1000, 4))
+    resultados.append(r)
+
+    r, indices_filtro = medir("indices_filtro", lambda: IndicesFiltro(df))
+    resultados.append(r)
+
+    # Fila de uma Categoria ordenada por Data, como um revisor designado a ela
+    categoria = indices_filtro.valores["Categoria"].distintos()[0] if "Categoria" in indices_filtro.valores else None
+
+    def montar_fila():
+        linhas = indices_filtro.filtrar(categorias=[categoria] if categoria else ())
+        linhas = np.arange(len(df)) if linhas is None else linhas
+        return FilaRevisao(indices_filtro.ordenar(linhas, "Data"), estado, filtrada=True)
+
+    r, fila_revisao = medir("fila_filtrada", montar_fila)
+    resultados.append(r)
+
+    def proximas_fila():
+        for p in posicoes:
+            fila_revisao.proxima_pendente(int(p) % max(len(fila_revisao), 1))
+
+    r, _ = medir("proxima_pendente_fila", proximas_fila)
+    r.update(repeticoes=amostras, ms_por_op=round(r["total_s"] / amostras * 1000, 4))
+    resultados.append(r)
+
+    def duplicatas():
+        validadas = estado.validadas
+        for p in posicoes:
+            membros = grupos.membros(int(p))
+            int((~validadas[membros]).sum())
+
+    r, _ = medir("contagem_duplicatas", duplicatas)
+    r.update(repeticoes=amostras, ms_por_op=round(r["total_s"] / amostras * 1000, 4))
+    resultados.append(r)
+
+    gravacao = GravacaoSegundoPlano(DiarioValidacao(os.environ["VALIDADOR_DIARIO"]))
+
+    # Mesma sequência do "Salvar e Avançar": gravar_decisao na linha atual e nas
+    # duplicatas pendentes; no fim espera o diário, para o commit entrar na conta
+    def salvar():
+        data_validacao = str(datetime.now())
+        for p in posicoes[:max(1, amostras // 10)]:
+            idx = int(p)
+            gravar_decisao(df, estado, idx, "SIM", "", data_validacao, gravacao, "benchmark")
+            membros = grupos.membros(idx)
+            membros = membros[membros != idx]
+            alvo = membros[~estado.validadas[membros]]
+            if len(alvo):
+                gravar_decisao(df, estado, alvo, "SIM", "", data_validacao + " (replicado)", gravacao, "benchmark")
+        gravacao.aguardar()
+
+    qtd_saves = max(1, amostras // 10)
+    r, _ = medir("salvar_replicar", salvar)
+    r.update(repeticoes=qtd_saves, ms_por_op=round(r["total_s"] / qtd_saves * 1000, 4))
+    resultados.append(r)
+
+    for formato in FORMATOS:
+        r, _ = medir(f"exportacao[{formato}]", lambda: serializar(df, formato))
+        resultados.append(r)
+    return resultados, df
+
+
+def medir_imagens(urls, max_workers=4):
+    """Download + decodificação + miniatura: sequencial sem cache, pré-busca e cache quente."""
+    resultados = []
+    qtd = len(urls)
+
+    def sequencial():
+        for url in urls:
+            carregar_imagem(url)
+
+    r, _ = medir("imagem_sem_cache", sequencial)
+    r.update(repeticoes=qtd, ms_por_op=round(r["total_s"] / qtd * 1000, 4))
+    resultados.append(r)
+
+    diretorio = tempfile.mkdtemp(dir=_TEMP)
+    cache = CacheDisco(diretorio)
+
+    def prebusca():
+        pool = PreBuscaImagens(cache=cache, max_workers=max_workers, capacidade=qtd)
+        for url in urls:
+            pool.agendar(url)
+        for url in urls:
+            pool.obter(url)
+        pool._executor.shutdown()
+
+    inicio = time.perf_counter()
+    prebusca()  # cache frio: mede o download em paralelo
+    total = time.perf_counter() - inicio
+    resultados.append({
+        "operacao": f"imagem_prebusca[{max_workers}]",
+        "repeticoes": qtd,
+        "total_s": round(total, 4),
+        "ms_por_op": round(total / qtd * 1000, 4),
+        "pico_mb": None,
+        "arrow_mb": None,
+    })
+
+    def cache_quente():
+        for url in urls:
+            carregar_imagem(url, cache)
+
+    r, _ = medir("imagem_cache_quente", cache_quente)
+    r.update(repeticoes=qtd, ms_por_op=round(r["total_s"] / qtd * 1000, 4))
+    resultados.append(r)
+
+    # Características da triagem: num processo só e no pool (bytes já em memória, só a extração conta)
+    conteudos = {url: buscar_imagem(url, cache).conteudo for url in urls}
+    obter_conteudo = conteudos.get
+
+    def um_processo():
+        for inicio in range(0, qtd, caracteristicas.TAMANHO_LOTE):
+            caracteristicas.extrair_lote([obter_conteudo(url) for url in urls[inicio:inicio + caracteristicas.TAMANHO_LOTE]])
+
+    r, _ = medir("caracteristicas[1]", um_processo)
+    r.update(repeticoes=qtd, ms_por_op=round(r["total_s"] / qtd * 1000, 4))
+    resultados.append(r)
+
+    inicio = time.perf_counter()
+    caracteristicas.extrair_todas(urls, obter_conteudo, processos=max_workers)
+    total = time.perf_counter() - inicio
+    resultados.append({
+        "operacao": f"caracteristicas_pool[{max_workers}]",
+        "repeticoes": qtd,
+        "total_s": round(total, 4),
+        "ms_por_op": round(total / qtd * 1000, 4),
+        "pico_mb": None,
+        "arrow_mb": None,
+    })
+    return resultados
+
+
+def medir_app(df, reruns):
+    """Roda o streamlit_app.py sem navegador e mede rerun e salvar."""
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(os.path.join(DIRETORIO, "streamlit_app.py"), default_timeout=600)
+    app.session_state.df = df.copy()
+    app.session_state.uploaded_file_id = "benchmark"
+    # Com o hash do arquivo, cada save também vai para o diário, como no app
+    app.session_state.arquivo_hash = "benchmark"
+    app.run()
+    if app.exception:
+        raise RuntimeError(f"Erro no app: {app.exception}")
+
+    r, _ = medir("app_rerun", app.run, repeticoes=reruns)
+    resultados = [r]
+
+    def salvar():
+        botoes = [b.key for b in app.button if b.key and b.key.startswith(("btn_s_", "btn_sem_"))]
+        if botoes:
+            app.button(key=botoes[0]).click().run()
+
+    r, _ = medir("app_salvar", salvar, repeticoes=reruns)
+    resultados.append(r)
+    return resultados
+
+
+def commit_atual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=DIRETORIO,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark das operações do validador de imagens.")
+    parser.add_argument("--dados", default=DADOS_PADRAO, help="CSV/XLSX base (padrão: dados.csv)")
+    parser.add_argument("--sintetico", action="store_true", help="usar base sintética em vez do arquivo")
+    parser.add_argument("--linhas", type=int, nargs="+", default=[10_000, 100_000],
+                        help="tamanhos da base (padrão: 10000 100000)")
+    parser.add_argument("--amostras", type=int, default=1000,
+                        help="consultas/saves por operação repetida (padrão: 1000)")
+    parser.add_argument("--imagens", type=int, default=200, help="URLs distintas baixadas (padrão: 200)")
+    parser.add_argument("--latencia", type=float, default=20, help="latência do servidor falso em ms (padrão: 20)")
+    parser.add_argument("--taxa-erro", type=float, default=0.02,
+                        help="fração de URLs respondendo 404/500 (padrão: 0.02)")
+    parser.add_argument("--app", action="store_true", help="medir também rerun/salvar do streamlit_app.py")
+    parser.add_argument("--reruns", type=int, default=20, help="reruns medidos com --app (padrão: 20)")
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--saida", help="acrescentar os resultados (JSON por linha) neste arquivo")
+    args = parser.parse_args(argv)
+
+    if args.sintetico:
+        base = base_sintetica(semente=args.semente)
+    else:
+        with open(args.dados, "rb") as f:
+            base = ler_planilha(f, args.dados)
+    servidor, url_base = iniciar_servidor(args.latencia, args.taxa_erro)
+    commit = commit_atual()
+
+    try:
+        for linhas in args.linhas:
+            print(f"== {linhas} linhas")
+            df = montar_dados(base, linhas, url_base)
+            resultados, df = medir_nucleo(df, os.path.join(_TEMP, f"base_{linhas}.csv"), args.amostras, args.semente)
+            if args.imagens:
+                urls = df[detectar_coluna_url(df)].drop_duplicates().head(args.imagens).tolist()
+                resultados += medir_imagens(urls)
+            if args.app:
+                resultados += medir_app(preparar_colunas(montar_dados(base, linhas, url_base)), args.reruns)
+
+            tabela = pd.DataFrame(resultados)
+            print(tabela.to_string(index=False))
+            if args.saida:
+                with open(args.saida, "a", encoding="utf-8") as f:
+                    for r in resultados:
+                        f.write(json.dumps({"commit": commit, "linhas": linhas, "latencia_ms": args.latencia,
+                                            "taxa_erro": args.taxa_erro, **r}, ensure_ascii=False) + "\n")
+    finally:
+        servidor.shutdown()
+        shutil.rmtree(_TEMP, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
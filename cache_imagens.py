@@ -0,0 +1,202 @@
+"""Cache em disco das imagens baixadas, com despejo LRU e revalidação.
+
+O índice fica num SQLite e os bytes em arquivos nomeados pelo SHA-256 do
+conteúdo, então a mesma imagem sob URLs diferentes ocupa espaço uma vez só.
+Falhas (404, timeout, conteúdo que não é imagem) também são guardadas, com
+validade própria, para não esperar de novo pelo mesmo erro.
+"""
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from urllib.parse import urlsplit, urlunsplit
+
+# Onde o app e a triagem guardam o cache, se nada for configurado
+DIRETORIO_PADRAO = os.environ.get("VALIDADOR_CACHE_DIR", ".cache_imagens")
+
+# Tempo (s) em que uma imagem baixada é usada sem consultar o servidor
+VALIDADE_POSITIVA = 24 * 3600
+# Tempo (s) em que um erro definitivo (4xx, não é imagem) é reaproveitado
+VALIDADE_NEGATIVA = 24 * 3600
+# Tempo (s) em que um erro transitório (timeout, conexão, 5xx) é reaproveitado
+VALIDADE_TRANSITORIA = 5 * 60
+
+
+def normalizar_chave(url):
+    """Normaliza a URL (esquema/host minúsculos, sem fragmento nem porta padrão)."""
+    partes = urlsplit(url.strip())
+    esquema = partes.scheme.lower()
+    host = (partes.hostname or "").lower()
+    if partes.port and not ((esquema == "http" and partes.port == 80) or (esquema == "https" and partes.port == 443)):
+        host = f"{host}:{partes.port}"
+    return urlunsplit((esquema, host, partes.path or "/", partes.query, ""))
+
+
+@dataclass
+class EntradaCache:
+    conteudo: bytes | None
+    erro: str
+    etag: str | None
+    last_modified: str | None
+    fresca: bool
+    status: int | None = None
+    content_type: str | None = None
+
+
+class CacheDisco:
+    """Cache persistente de respostas de imagem, limitado a `limite_bytes`."""
+
+    def __init__(self, diretorio, limite_bytes=500 * 1024 * 1024):
+        self.diretorio = diretorio
+        self.limite_bytes = limite_bytes
+        os.makedirs(os.path.join(diretorio, "objetos"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(diretorio, "indice.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS entradas (
+                chave TEXT PRIMARY KEY,
+                sha256 TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                erro TEXT NOT NULL DEFAULT '',
+                expira_em REAL NOT NULL,
+                ultimo_acesso REAL NOT NULL,
+                status INTEGER,
+                content_type TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_entradas_acesso ON entradas(ultimo_acesso);
+            CREATE INDEX IF NOT EXISTS idx_entradas_sha ON entradas(sha256);
+            CREATE TABLE IF NOT EXISTS objetos (
+                sha256 TEXT PRIMARY KEY,
+                tamanho INTEGER NOT NULL
+            );
+        """)
+        # Índices criados antes de status/content_type existirem
+        colunas = {linha[1] for linha in self._conn.execute("PRAGMA table_info(entradas)")}
+        for coluna, tipo in (("status", "INTEGER"), ("content_type", "TEXT")):
+            if coluna not in colunas:
+                self._conn.execute(f"ALTER TABLE entradas ADD COLUMN {coluna} {tipo}")
+        self._conn.commit()
+
+    def _caminho(self, sha):
+        return os.path.join(self.diretorio, "objetos", sha[:2], sha)
+
+    def consultar(self, url):
+        """Retorna a EntradaCache da URL, ou None se não houver nada guardado."""
+        chave = normalizar_chave(url)
+        agora = time.time()
+        with self._lock:
+            linha = self._conn.execute(
+                "SELECT sha256, etag, last_modified, erro, expira_em, status, content_type FROM entradas WHERE chave = ?",
+                (chave,),
+            ).fetchone()
+            if linha is None:
+                return None
+            self._conn.execute("UPDATE entradas SET ultimo_acesso = ? WHERE chave = ?", (agora, chave))
+            self._conn.commit()
+        sha, etag, last_modified, erro, expira_em, status, content_type = linha
+        fresca = expira_em > agora
+        conteudo = None
+        if sha:
+            try:
+                with open(self._caminho(sha), "rb") as f:
+                    conteudo = f.read()
+            except OSError:
+                # Arquivo sumiu do disco: trata como ausente
+                return None
+        elif not fresca:
+            # Erro vencido não serve nem para revalidação
+            return None
+        return EntradaCache(conteudo, erro, etag, last_modified, fresca, status, content_type)
+
+    def guardar(self, url, conteudo, etag=None, last_modified=None, status=200, content_type=None):
+        """Guarda uma resposta de imagem bem-sucedida."""
+        sha = hashlib.sha256(conteudo).hexdigest()
+        caminho = self._caminho(sha)
+        chave = normalizar_chave(url)
+        agora = time.time()
+        with self._lock:
+            if not os.path.exists(caminho):
+                os.makedirs(os.path.dirname(caminho), exist_ok=True)
+                fd, temporario = tempfile.mkstemp(dir=os.path.dirname(caminho))
+                with os.fdopen(fd, "wb") as f:
+                    f.write(conteudo)
+                os.replace(temporario, caminho)
+            anterior = self._sha_atual(chave)
+            self._conn.execute("INSERT OR IGNORE INTO objetos (sha256, tamanho) VALUES (?, ?)", (sha, len(conteudo)))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entradas "
+                "(chave, sha256, etag, last_modified, erro, expira_em, ultimo_acesso, status, content_type) "
+                "VALUES (?, ?, ?, ?, '', ?, ?, ?, ?)",
+                (chave, sha, etag, last_modified, agora + VALIDADE_POSITIVA, agora, status, content_type),
+            )
+            if anterior and anterior != sha:
+                self._soltar(anterior)
+            self._despejar()
+            self._conn.commit()
+
+    def revalidar(self, url):
+        """Renova a validade de uma entrada confirmada pelo servidor (HTTP 304)."""
+        agora = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE entradas SET expira_em = ?, ultimo_acesso = ? WHERE chave = ?",
+                (agora + VALIDADE_POSITIVA, agora, normalizar_chave(url)),
+            )
+            self._conn.commit()
+
+    def guardar_erro(self, url, erro, transitorio=False, status=None, content_type=None):
+        """Guarda uma falha de carregamento para não repetir a requisição."""
+        chave = normalizar_chave(url)
+        agora = time.time()
+        validade = VALIDADE_TRANSITORIA if transitorio else VALIDADE_NEGATIVA
+        with self._lock:
+            anterior = self._sha_atual(chave)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entradas "
+                "(chave, sha256, etag, last_modified, erro, expira_em, ultimo_acesso, status, content_type) "
+                "VALUES (?, NULL, NULL, NULL, ?, ?, ?, ?, ?)",
+                (chave, erro, agora + validade, agora, status, content_type),
+            )
+            if anterior:
+                self._soltar(anterior)
+            self._conn.commit()
+
+    def _sha_atual(self, chave):
+        linha = self._conn.execute("SELECT sha256 FROM entradas WHERE chave = ?", (chave,)).fetchone()
+        return linha[0] if linha else None
+
+    def _soltar(self, sha):
+        """Apaga o objeto se nenhuma entrada o referencia mais. Retorna True se apagou."""
+        if self._conn.execute("SELECT 1 FROM entradas WHERE sha256 = ? LIMIT 1", (sha,)).fetchone() is not None:
+            return False
+        self._apagar_objeto(sha)
+        return True
+
+    def _apagar_objeto(self, sha):
+        try:
+            os.remove(self._caminho(sha))
+        except OSError:
+            pass
+        self._conn.execute("DELETE FROM objetos WHERE sha256 = ?", (sha,))
+
+    def _despejar(self):
+        """Remove as entradas menos usadas até caber no limite (chamar com o lock)."""
+        (total,) = self._conn.execute("SELECT COALESCE(SUM(tamanho), 0) FROM objetos").fetchone()
+        if total <= self.limite_bytes:
+            return
+        candidatas = self._conn.execute(
+            "SELECT e.chave, e.sha256, o.tamanho FROM entradas e JOIN objetos o ON o.sha256 = e.sha256 "
+            "ORDER BY e.ultimo_acesso"
+        ).fetchall()
+        for chave, sha, tamanho in candidatas:
+            self._conn.execute("DELETE FROM entradas WHERE chave = ?", (chave,))
+            if self._soltar(sha):
+                total -= tamanho
+            if total <= self.limite_bytes:
+                break
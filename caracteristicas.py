@@ -0,0 +1,208 @@
+"""Características baratas das imagens, calculadas em lote, e sugestões de veredito.
+
+Cada imagem baixada vira uma linha com dimensões, tamanho do arquivo,
+SHA-256, média e variância da luminância, nitidez (variância do Laplaciano)
+e EXIF (presença e data). As imagens de um lote são decodificadas em escala
+reduzida e empilhadas numa matriz, então as estatísticas saem de operações
+NumPy sobre o lote inteiro; os lotes rodam num pool de processos.
+
+`sugerir` transforma as características em (Valida, Motivo, confiança) por
+linha: casos óbvios (foto em branco, minúscula, reenvio de arquivo
+idêntico, captura de tela, EXIF antigo) saem com confiança alta para o
+revisor confirmar em bloco, e o tempo humano fica com os casos ambíguos.
+"""
+import hashlib
+import multiprocessing
+import os
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, wait
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+# Lado da amostra em tons de cinza usada para luminância e nitidez
+LADO_AMOSTRA = 256
+# Imagens enviadas por vez a cada processo
+TAMANHO_LOTE = 64
+
+# Limiares das sugestões
+VARIANCIA_UNIFORME = 30.0  # luminância quase constante: foto em branco/preta/tampada
+LADO_MINIMO = 200  # px; menor que isso não dá para ver o ponto extra
+NITIDEZ_MINIMA = 15.0  # variância do Laplaciano abaixo disso: foto tremida/desfocada
+DIAS_EXIF = 30  # EXIF mais distante que isso da Data informada: foto reaproveitada
+
+# Tags EXIF: DateTimeOriginal (no IFD Exif) e DateTime (no IFD principal)
+_IFD_EXIF = 0x8769
+_TAG_DATA_ORIGINAL = 36867
+_TAG_DATA = 306
+FORMATO_EXIF = "%Y:%m:%d %H:%M:%S"
+
+COLUNAS_CARACTERISTICAS = ["Img_Largura", "Img_Altura", "Img_Bytes", "Img_SHA256", "Img_Formato",
+                           "Img_Luminancia_Media", "Img_Luminancia_Var", "Img_Nitidez",
+                           "Img_EXIF", "Img_EXIF_Data"]
+COLUNAS_SUGESTAO = ["Sugestao_Valida", "Sugestao_Motivo", "Sugestao_Confianca"]
+# Sugestão sem veredito: a imagem existe, mas pequena/desfocada demais para decidir sem olhar
+REVISAR = "REVISAR"
+
+
+def _ler(conteudo):
+    """Metadados do arquivo e amostra LADO_AMOSTRA x LADO_AMOSTRA em cinza (ou None)."""
+    info = {
+        "Img_Bytes": len(conteudo),
+        "Img_SHA256": hashlib.sha256(conteudo).hexdigest(),
+    }
+    try:
+        img = Image.open(BytesIO(conteudo))
+        info["Img_Largura"], info["Img_Altura"] = img.size
+        info["Img_Formato"] = img.format
+        exif = img.getexif()
+        info["Img_EXIF"] = len(exif) > 0
+        data = exif.get_ifd(_IFD_EXIF).get(_TAG_DATA_ORIGINAL) or exif.get(_TAG_DATA)
+        info["Img_EXIF_Data"] = str(data).strip("\x00 ") if data else None
+        # Decodificação reduzida (JPEG): basta para as estatísticas
+        img.draft('L', (LADO_AMOSTRA, LADO_AMOSTRA))
+        amostra = img.convert('L').resize((LADO_AMOSTRA, LADO_AMOSTRA), Image.Resampling.BILINEAR)
+        return info, np.asarray(amostra, dtype=np.uint8)
+    except Exception:
+        return info, None
+
+
+def estatisticas_lote(amostras):
+    """Média e variância da luminância e variância do Laplaciano de cada amostra.
+
+    `amostras` tem forma (n, lado, lado); o Laplaciano 4-vizinhos é feito com
+    fatias da matriz inteira, sem laço por imagem.
+    """
+    x = amostras.astype(np.float32)
+    media = x.mean(axis=(1, 2))
+    variancia = x.var(axis=(1, 2))
+    laplaciano = (x[:, :-2, 1:-1] + x[:, 2:, 1:-1] + x[:, 1:-1, :-2] + x[:, 1:-1, 2:]
+                  - 4 * x[:, 1:-1, 1:-1])
+    return media, variancia, laplaciano.var(axis=(1, 2))
+
+
+def extrair_lote(conteudos):
+    """Características de cada conteúdo do lote (None vira dict vazio)."""
+    resultados = [{} for _ in conteudos]
+    validas, amostras = [], []
+    for i, conteudo in enumerate(conteudos):
+        if conteudo is None:
+            continue
+        info, amostra = _ler(conteudo)
+        resultados[i] = info
+        if amostra is not None:
+            validas.append(i)
+            amostras.append(amostra)
+    if amostras:
+        media, variancia, nitidez = estatisticas_lote(np.stack(amostras))
+        for k, i in enumerate(validas):
+            resultados[i]["Img_Luminancia_Media"] = round(float(media[k]), 2)
+            resultados[i]["Img_Luminancia_Var"] = round(float(variancia[k]), 2)
+            resultados[i]["Img_Nitidez"] = round(float(nitidez[k]), 2)
+    return resultados
+
+
+def extrair_todas(urls, obter_conteudo, processos=None, tamanho_lote=TAMANHO_LOTE):
+    """Características de cada URL, em lotes distribuídos num pool de processos.
+
+    `obter_conteudo(url)` roda neste processo (normalmente lendo do cache em
+    disco) e devolve os bytes ou None. No máximo dois lotes por processo
+    ficam em memória ao mesmo tempo.
+    """
+    processos = processos or os.cpu_count() or 1
+    resultados = {}
+    # spawn: o processo principal já tem threads (downloads, cache)
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=processos, mp_context=contexto) as pool:
+        em_andamento = {}
+
+        def coletar(quando):
+            feitos, _ = wait(em_andamento, return_when=quando)
+            for futuro in feitos:
+                resultados.update(zip(em_andamento.pop(futuro), futuro.result()))
+
+        for inicio in range(0, len(urls), tamanho_lote):
+            lote = urls[inicio:inicio + tamanho_lote]
+            em_andamento[pool.submit(extrair_lote, [obter_conteudo(url) for url in lote])] = lote
+            if len(em_andamento) >= 2 * processos:
+                coletar(FIRST_COMPLETED)
+        if em_andamento:
+            coletar(ALL_COMPLETED)
+    return resultados
+
+
+def _reaproveitada(hashes, urls, datas=None):
+    """Linhas cujo arquivo (byte a byte) já apareceu antes em outra URL.
+
+    A primeira URL de cada arquivo (Data mais antiga, depois a ordem das
+    linhas) é o envio original e não é marcada; só as outras são reuso.
+    """
+    ordem = pd.DataFrame({"hash": hashes, "url": urls})
+    if datas is not None and pd.api.types.is_datetime64_any_dtype(datas):
+        ordem["data"] = datas
+        ordem = ordem.sort_values("data", kind="stable", na_position="last")
+    por_hash = ordem.groupby("hash")["url"]
+    reuso = (por_hash.transform("nunique") > 1) & (ordem["url"] != por_hash.transform("first"))
+    return reuso.reindex(hashes.index, fill_value=False)
+
+
+def sugerir(caracteristicas, urls, datas=None):
+    """Sugestão (Valida, Motivo, confiança) por linha, a partir das características.
+
+    `caracteristicas` tem as COLUNAS_CARACTERISTICAS por linha, `urls` a URL
+    normalizada de cada linha e `datas` a Data informada (datetime), se
+    houver. Regras, da mais forte para a mais fraca: sem imagem, foto
+    uniforme, reenvio de arquivo idêntico, imagem minúscula, EXIF longe da
+    Data, captura de tela (PNG sem EXIF) e foto desfocada; o resto sai como
+    válida com confiança baixa, para revisão humana. O motivo de um NÃO é
+    sempre um dos que o app grava (MOTIVOS_OPCOES ou SEM IMAGEM); imagem
+    minúscula ou desfocada sai como REVISAR, sem motivo.
+    """
+    c = caracteristicas
+    sem_imagem = c["Img_SHA256"].isna() | c["Img_Luminancia_Var"].isna()
+    uniforme = c["Img_Luminancia_Var"] < VARIANCIA_UNIFORME
+    repetida = _reaproveitada(c["Img_SHA256"], urls, datas)
+    minuscula = np.minimum(c["Img_Largura"], c["Img_Altura"]) < LADO_MINIMO
+    exif_antigo = pd.Series(False, index=c.index)
+    if datas is not None and pd.api.types.is_datetime64_any_dtype(datas):
+        data_exif = pd.to_datetime(c["Img_EXIF_Data"], format=FORMATO_EXIF, errors="coerce")
+        exif_antigo = ((datas - data_exif).abs() > pd.Timedelta(days=DIAS_EXIF)).fillna(False)
+    captura = c["Img_Formato"].eq("PNG") & ~c["Img_EXIF"].fillna(False).astype(bool)
+    desfocada = c["Img_Nitidez"] < NITIDEZ_MINIMA
+
+    regras = [
+        (sem_imagem, "NÃO", "SEM IMAGEM", 0.95),
+        # Foto em branco/preta/tampada: não mostra ponto extra nenhum
+        (uniforme, "NÃO", "NÃO É PONTO EXTRA", 0.9),
+        (repetida, "NÃO", "MESMA IMAGEM", 0.85),
+        (minuscula, REVISAR, "", 0.7),
+        (exif_antigo, "NÃO", "FRAUDE", 0.65),
+        (captura, "NÃO", "FRAUDE", 0.6),
+        (desfocada, REVISAR, "", 0.4),
+    ]
+    condicoes = [cond.fillna(False).to_numpy(dtype=bool) for cond, *_ in regras]
+    # Válida: só com EXIF ganha um pouco de confiança; conteúdo e categoria pedem olho humano
+    confianca_valida = np.where(c["Img_EXIF"].fillna(False).astype(bool), 0.5, 0.3)
+    return pd.DataFrame({
+        "Sugestao_Valida": np.select(condicoes, [r[1] for r in regras], "SIM"),
+        "Sugestao_Motivo": np.select(condicoes, [r[2] for r in regras], ""),
+        "Sugestao_Confianca": np.select(condicoes, [r[3] for r in regras], confianca_valida),
+    }, index=c.index)
+
+
+def anotar(df, urls, resultados):
+    """Acrescenta ao DataFrame as características (por URL) e as sugestões."""
+    caracteristicas = pd.DataFrame([resultados.get(url, {}) for url in urls], index=df.index)
+    caracteristicas = caracteristicas.reindex(columns=COLUNAS_CARACTERISTICAS)
+    for col in ("Img_Largura", "Img_Altura", "Img_Bytes"):
+        caracteristicas[col] = caracteristicas[col].astype("Int64")
+    for col in ("Img_Luminancia_Media", "Img_Luminancia_Var", "Img_Nitidez"):
+        caracteristicas[col] = caracteristicas[col].astype(float)
+    caracteristicas["Img_EXIF"] = caracteristicas["Img_EXIF"].astype("boolean")
+    sugestoes = sugerir(caracteristicas, pd.Series(urls, index=df.index), df.get("Data"))
+    for col in COLUNAS_CARACTERISTICAS:
+        df[col] = caracteristicas[col]
+    for col in COLUNAS_SUGESTAO:
+        df[col] = sugestoes[col]
+    return df
@@ -0,0 +1,231 @@
+"""Leitura dos arquivos enviados (.csv/.xlsx) para validação.
+
+O CSV é lido uma única vez pelo parser C: separador e codificação saem de
+uma amostra do começo do arquivo, identificadores (CNPJ, URL) ficam como
+texto, colunas de poucos valores distintos viram `category` e a Data é
+convertida para datetime no carregamento. O XLSX é lido em streaming
+(openpyxl em modo somente leitura), em blocos de linhas.
+"""
+import csv
+from datetime import datetime
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+COLUNAS_VALIDACAO = ["Valida", "Motivos", "Data_Validacao"]
+
+MOTIVOS_OPCOES = ['FRAUDE', 'MESMA IMAGEM', 'NÃO É PONTO EXTRA', 'OUTRA CATEGORIA', 'OUTRO PRODUTO']
+
+# Colunas com poucos valores distintos, guardadas como `category`
+COLUNAS_CATEGORIA = ["Categoria", "Valida", "Motivos", "Sugestao_Valida", "Sugestao_Motivo"]
+# Colunas numéricas gravadas pela triagem (caracteristicas.py)
+COLUNAS_NUMERICAS = ["Sugestao_Confianca"]
+# Valores que o app grava nas colunas categóricas de validação
+CATEGORIAS_VALIDACAO = {
+    "Valida": ["", "SIM", "NÃO"],
+    "Motivos": ["", "SEM IMAGEM"] + MOTIVOS_OPCOES,
+}
+COLUNA_DATA = "Data"
+FORMATO_DATA = "%d/%m/%Y"
+FORMATO_DATA_MINUTO = "%d/%m/%Y %H:%M"
+FORMATO_DATA_HORA = "%d/%m/%Y %H:%M:%S"
+# Formatos aceitos na coluna Data, em ordem; a coluna inteira precisa servir num só
+FORMATOS_DATA_ENTRADA = [FORMATO_DATA, FORMATO_DATA_MINUTO, FORMATO_DATA_HORA, "ISO8601"]
+
+# Bytes lidos do começo do arquivo para descobrir separador e codificação
+TAMANHO_AMOSTRA = 64 * 1024
+# Linhas por bloco na leitura
+TAMANHO_BLOCO = 100_000
+
+_BOM_UTF8 = b"\xef\xbb\xbf"
+# Tentadas, em ordem, quando a codificação detectada na amostra falha mais adiante
+CODIFICACOES_ALTERNATIVAS = ["cp1252", "latin-1"]
+
+
+def _voltar_inicio(arquivo):
+    if hasattr(arquivo, "seek"):
+        arquivo.seek(0)
+
+
+def detectar_formato(amostra):
+    """Retorna (codificação, separador, cabeçalho) a partir dos primeiros bytes do CSV."""
+    if amostra.startswith(_BOM_UTF8):
+        codificacao = "utf-8-sig"
+    else:
+        try:
+            # Corta o fim da amostra, que pode ter parado no meio de um caractere
+            amostra[:-4].decode("utf-8")
+            codificacao = "utf-8"
+        except UnicodeDecodeError:
+            codificacao = "latin-1"
+    texto = amostra.decode(codificacao, errors="ignore")
+    linhas = texto.splitlines()
+    # A última linha da amostra pode estar incompleta
+    if len(linhas) > 1:
+        linhas = linhas[:-1]
+    try:
+        separador = csv.Sniffer().sniff("\n".join(linhas), delimiters=";,\t|").delimiter
+    except csv.Error:
+        primeira = linhas[0] if linhas else ""
+        separador = max(";,\t|", key=primeira.count)
+    cabecalho = next(csv.reader(linhas[:1], delimiter=separador), [])
+    return codificacao, separador, cabecalho
+
+
+def _tipo_coluna(nome):
+    if nome in COLUNAS_NUMERICAS:
+        return "float64"
+    return "category" if nome in COLUNAS_CATEGORIA else "str"
+
+
+def _juntar_blocos(blocos):
+    """Concatena os blocos mantendo as colunas categóricas (categorias unidas)."""
+    if len(blocos) == 1:
+        return blocos[0]
+    for col in blocos[0].columns:
+        if isinstance(blocos[0][col].dtype, pd.CategoricalDtype):
+            categorias = union_categoricals([b[col] for b in blocos]).categories
+            for b in blocos:
+                b[col] = b[col].cat.set_categories(categorias)
+    return pd.concat(blocos, ignore_index=True)
+
+
+def converter_data(df):
+    """Converte a coluna Data para datetime, se todos os valores servirem num dos formatos.
+
+    Um formato por coluna, sem adivinhar dia/mês valor a valor: dd/mm/aaaa
+    (com ou sem hora) ou ISO 8601. Fora disso, mantém o texto original.
+    """
+    if COLUNA_DATA not in df.columns:
+        return df
+    texto = df[COLUNA_DATA]
+    for formato in FORMATOS_DATA_ENTRADA:
+        datas = pd.to_datetime(texto, format=formato, errors="coerce")
+        if not (datas.isna() & texto.notna()).any():
+            df[COLUNA_DATA] = datas
+            break
+    return df
+
+
+def formato_data(datas):
+    """Formato de escrita da coluna Data: só dd/mm/aaaa se nenhum valor tiver hora."""
+    if datas is None or not pd.api.types.is_datetime64_any_dtype(datas):
+        return FORMATO_DATA
+    datas = datas.dropna()
+    if (datas.dt.second != 0).any():
+        return FORMATO_DATA_HORA
+    if (datas != datas.dt.normalize()).any():
+        return FORMATO_DATA_MINUTO
+    return FORMATO_DATA
+
+
+def ler_csv(arquivo):
+    """Lê o CSV num único passe do parser C."""
+    if isinstance(arquivo, str):
+        with open(arquivo, "rb") as f:
+            return ler_csv(f)
+    amostra = arquivo.read(TAMANHO_AMOSTRA)
+    _voltar_inicio(arquivo)
+    codificacao, separador, cabecalho = detectar_formato(amostra)
+    try:
+        return _ler_csv(arquivo, codificacao, separador, cabecalho)
+    except UnicodeDecodeError:
+        # Amostra toda em ASCII e acento só depois dela: CSV do Excel (cp1252) lido como UTF-8
+        for alternativa in CODIFICACOES_ALTERNATIVAS:
+            _voltar_inicio(arquivo)
+            try:
+                return _ler_csv(arquivo, alternativa, separador, cabecalho)
+            except UnicodeDecodeError:
+                continue
+        raise
+
+
+def _ler_csv(arquivo, codificacao, separador, cabecalho):
+    leitor = pd.read_csv(
+        arquivo,
+        sep=separador,
+        encoding=codificacao,
+        engine="c",
+        dtype={nome: _tipo_coluna(nome) for nome in cabecalho},
+        # Só célula vazia é ausente; textos como "NA" ficam como estão
+        keep_default_na=False,
+        na_values=[""],
+        chunksize=TAMANHO_BLOCO,
+    )
+    with leitor:
+        return converter_data(_juntar_blocos(list(leitor)))
+
+
+def _texto_celula(valor):
+    if valor is None:
+        return None
+    if isinstance(valor, float) and valor.is_integer():
+        # CNPJ digitado como número no Excel: sem ".0" nem notação científica
+        return str(int(valor))
+    if isinstance(valor, datetime):
+        return valor
+    return str(valor)
+
+
+def ler_xlsx(arquivo):
+    """Lê a primeira planilha do XLSX em streaming, em blocos de linhas."""
+    from openpyxl import load_workbook
+
+    _voltar_inicio(arquivo)
+    livro = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        linhas = livro.active.iter_rows(values_only=True)
+        cabecalho = [str(c) if c is not None else f"Unnamed: {i}" for i, c in enumerate(next(linhas, ()))]
+        tipos = {nome: _tipo_coluna(nome) for nome in cabecalho if nome != COLUNA_DATA}
+
+        blocos, bloco = [], []
+        for linha in linhas:
+            bloco.append([_texto_celula(v) for v in linha])
+            if len(bloco) == TAMANHO_BLOCO:
+                blocos.append(pd.DataFrame(bloco, columns=cabecalho).astype(tipos))
+                bloco = []
+        if bloco or not blocos:
+            blocos.append(pd.DataFrame(bloco, columns=cabecalho).astype(tipos))
+    finally:
+        livro.close()
+    return converter_data(_juntar_blocos(blocos))
+
+
+def ler_planilha(arquivo, nome):
+    """Lê o CSV/XLSX (`arquivo` pode ser caminho ou file-like) em um DataFrame."""
+    if nome.lower().endswith('.csv'):
+        return ler_csv(arquivo)
+    return ler_xlsx(arquivo)
+
+
+def preparar_colunas(df):
+    """Garante as colunas de validação: Valida/Motivos categóricas, Data_Validacao texto."""
+    for col in COLUNAS_VALIDACAO:
+        if col not in df.columns:
+            df[col] = ""
+        if col in CATEGORIAS_VALIDACAO:
+            serie = garantir_categorias(df[col].astype("category"), CATEGORIAS_VALIDACAO[col])
+            # Célula vazia vira "" (e não "nan"), como uma linha ainda não validada
+            df[col] = serie.fillna("")
+        else:
+            df[col] = df[col].astype(str)
+    return df
+
+
+def garantir_categorias(serie, valores):
+    """Acrescenta às categorias da série os `valores` que ainda não existem."""
+    if not isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie
+    novos = [v for v in dict.fromkeys(valores) if v not in serie.cat.categories]
+    return serie.cat.add_categories(novos) if novos else serie
+
+
+def formatar_data(valor):
+    """Texto da Data para exibição (dd/mm/aaaa, com a hora se houver, quando for datetime)."""
+    if isinstance(valor, datetime):
+        if valor.second:
+            return valor.strftime(FORMATO_DATA_HORA)
+        if valor.hour or valor.minute:
+            return valor.strftime(FORMATO_DATA_MINUTO)
+        return valor.strftime(FORMATO_DATA)
+    return str(valor)
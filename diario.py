@@ -0,0 +1,156 @@
+"""Diário persistente das validações, para retomar o trabalho após queda ou refresh.
+
+Cada save grava só as linhas alteradas (append-only, SQLite em modo WAL),
+identificadas pelo hash do conteúdo do arquivo enviado. Ao reenviar o mesmo
+arquivo, o diário é reaplicado de uma vez sobre o DataFrame; no modo em
+equipe, as decisões novas dos outros revisores são puxadas a cada rerun.
+"""
+import hashlib
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from carregador import COLUNAS_VALIDACAO, garantir_categorias
+
+
+def hash_arquivo(conteudo):
+    """Identificador do arquivo enviado (SHA-256 dos bytes)."""
+    return hashlib.sha256(conteudo).hexdigest()
+
+
+class DiarioValidacao:
+    """Registro append-only de decisões por (arquivo, linha)."""
+
+    def __init__(self, caminho):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(caminho, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Em WAL, NORMAL não perde commits numa queda do processo, só numa queda do SO
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS decisoes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                arquivo TEXT NOT NULL,
+                linha INTEGER NOT NULL,
+                valida TEXT NOT NULL,
+                motivos TEXT NOT NULL,
+                data_validacao TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_decisoes_arquivo ON decisoes(arquivo, linha, seq);
+            CREATE INDEX IF NOT EXISTS idx_decisoes_seq ON decisoes(arquivo, seq);
+        """)
+        self._conn.commit()
+
+    def registrar(self, arquivo, posicoes, valida, motivos, data_validacao):
+        """Acrescenta a mesma decisão para várias linhas numa única transação."""
+        registros = [(arquivo, int(p), valida, motivos, data_validacao) for p in posicoes]
+        if not registros:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO decisoes (arquivo, linha, valida, motivos, data_validacao) VALUES (?, ?, ?, ?, ?)",
+                registros,
+            )
+            self._conn.commit()
+
+    def novas_desde(self, arquivo, seq=0):
+        """Última decisão de cada linha registrada depois de `seq`.
+
+        Retorna (registros, ultimo_seq), com `registros` nas colunas
+        linha/Valida/Motivos/Data_Validacao.
+        """
+        with self._lock:
+            linhas = self._conn.execute(
+                "SELECT seq, linha, valida, motivos, data_validacao FROM decisoes "
+                "WHERE seq IN (SELECT MAX(seq) FROM decisoes WHERE arquivo = ? AND seq > ? GROUP BY linha)",
+                (arquivo, seq),
+            ).fetchall()
+        registros = pd.DataFrame(linhas, columns=['seq', 'linha'] + COLUNAS_VALIDACAO)
+        ultimo_seq = int(registros['seq'].max()) if len(registros) else seq
+        return registros.drop(columns='seq'), ultimo_seq
+
+
+class GravacaoSegundoPlano:
+    """Escreve no diário numa thread própria, na ordem dos saves.
+
+    O save já vale na tela assim que o DataFrame é atualizado; o commit no
+    SQLite acontece depois, sem segurar o rerun. Uma gravação que falha
+    fica guardada, com os argumentos, até `retirar_falhas` entregá-la à
+    sessão do mesmo arquivo (a instância é compartilhada entre sessões).
+    """
+
+    def __init__(self, diario):
+        self.diario = diario
+        self._falhas = []
+        self._pendentes = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="diario")
+
+    @property
+    def pendentes(self):
+        return self._pendentes
+
+    def registrar(self, arquivo, posicoes, valida, motivos, data_validacao):
+        """Enfileira `DiarioValidacao.registrar` com os mesmos argumentos."""
+        posicoes = [int(p) for p in posicoes]
+        with self._lock:
+            self._pendentes += 1
+        self._executor.submit(self._gravar, arquivo, posicoes, valida, motivos, data_validacao)
+
+    def _gravar(self, *argumentos):
+        try:
+            self.diario.registrar(*argumentos)
+        except Exception as e:
+            with self._lock:
+                self._falhas.append((argumentos, f"{type(e).__name__}: {e}"))
+        finally:
+            with self._lock:
+                self._pendentes -= 1
+
+    def regravar(self, arquivo, df, posicoes):
+        """Enfileira o estado atual das linhas, para repetir gravações que falharam.
+
+        Grava o que está no DataFrame, e não a decisão que falhou, que pode já
+        ter sido corrigida depois.
+        """
+        atuais = df[COLUNAS_VALIDACAO].iloc[posicoes].astype(str)
+        atuais.index = posicoes
+        for (valida, motivos, data_validacao), grupo in atuais.groupby(COLUNAS_VALIDACAO):
+            self.registrar(arquivo, grupo.index, valida, motivos, data_validacao)
+
+    def retirar_falhas(self, arquivo):
+        """Gravações de `arquivo` que falharam, como (argumentos, erro); saem da lista."""
+        with self._lock:
+            falhas = [f for f in self._falhas if f[0][0] == arquivo]
+            self._falhas = [f for f in self._falhas if f[0][0] != arquivo]
+        return falhas
+
+    def aguardar(self):
+        """Espera as gravações já enfileiradas."""
+        self._executor.submit(lambda: None).result()
+
+
+def gravar_decisao(df, estado, posicoes, valida, motivos, data_validacao, gravacao=None, arquivo=None):
+    """Grava a decisão nas linhas (posições): DataFrame, contadores do `estado` e diário.
+
+    O diário só é escrito com `gravacao` e `arquivo` (hash do arquivo enviado),
+    em segundo plano.
+    """
+    posicoes = np.atleast_1d(posicoes)
+    df.loc[df.index[posicoes], COLUNAS_VALIDACAO] = [valida, motivos, data_validacao]
+    estado.marcar(posicoes, valida)
+    if gravacao is not None and arquivo:
+        gravacao.registrar(arquivo, posicoes, valida, motivos, data_validacao)
+
+
+def aplicar(df, registros):
+    """Escreve os registros do diário no DataFrame. Retorna os que couberam."""
+    registros = registros[registros['linha'] < len(df)]
+    if len(registros):
+        for col in COLUNAS_VALIDACAO:
+            df[col] = garantir_categorias(df[col], registros[col].unique())
+        df.loc[df.index[registros['linha'].to_numpy()], COLUNAS_VALIDACAO] = registros[COLUNAS_VALIDACAO].to_numpy()
+    return registros
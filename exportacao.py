@@ -0,0 +1,75 @@
+"""Geração sob demanda dos arquivos de download."""
+import gzip
+import importlib.util
+import io
+import threading
+
+from carregador import COLUNA_DATA, formato_data
+from metricas import metricas
+
+# Linhas escritas por vez na exportação CSV
+TAMANHO_BLOCO = 50_000
+
+# nome do formato -> (extensão, mime)
+FORMATOS = {
+    "CSV": ("csv", "text/csv"),
+    "CSV compactado (.gz)": ("csv.gz", "application/gzip"),
+}
+# Parquet só aparece se o pyarrow estiver instalado
+if importlib.util.find_spec("pyarrow") is not None:
+    FORMATOS["Parquet"] = ("parquet", "application/vnd.apache.parquet")
+
+
+def _escrever_csv(df, destino):
+    texto = io.TextIOWrapper(destino, encoding='utf-8-sig', newline='')
+    df.to_csv(texto, index=False, sep=";", chunksize=TAMANHO_BLOCO, date_format=formato_data(df.get(COLUNA_DATA)))
+    texto.flush()
+    texto.detach()
+
+
+def serializar(df, formato):
+    """Serializa o DataFrame no formato escolhido e retorna os bytes."""
+    buffer = io.BytesIO()
+    with metricas.etapa("exportacao"):
+        if formato == "CSV":
+            _escrever_csv(df, buffer)
+        elif formato == "CSV compactado (.gz)":
+            with gzip.GzipFile(fileobj=buffer, mode="wb", mtime=0) as compactado:
+                _escrever_csv(df, compactado)
+        elif formato == "Parquet":
+            df.to_parquet(buffer, index=False)
+        else:
+            raise ValueError(f"Formato de exportação desconhecido: {formato}")
+    return buffer.getvalue()
+
+
+class CacheExportacao:
+    """Guarda o último arquivo gerado de cada tipo, pela versão dos dados.
+
+    Os botões de download recebem `gerador(...)`, que só serializa quando o
+    usuário clica; cliques seguintes sem nenhum save no meio reaproveitam
+    os bytes já gerados.
+    """
+
+    def __init__(self):
+        self._arquivos = {}
+        self._lock = threading.Lock()
+
+    def obter(self, chave, versao, formato, montar_df):
+        if callable(versao):
+            versao = versao()
+        with self._lock:
+            guardado = self._arquivos.get((chave, formato))
+            if guardado and guardado[0] == versao:
+                return guardado[1]
+            dados = serializar(montar_df(), formato)
+            self._arquivos[(chave, formato)] = (versao, dados)
+            return dados
+
+    def gerador(self, chave, versao, formato, montar_df):
+        """Callable sem argumentos para o parâmetro `data` do st.download_button.
+
+        `versao` pode ser um callable, lido só no clique (saves feitos em
+        fragmentos não redesenham os botões de download).
+        """
+        return lambda: self.obter(chave, versao, formato, montar_df)
@@ -0,0 +1,106 @@
+"""Fila compartilhada para vários revisores validarem o mesmo arquivo em paralelo.
+
+Cada unidade de trabalho é um grupo (URL, Categoria), identificado pela
+primeira linha do grupo. Um revisor recebe um arrendamento (lease) sobre
+uma unidade pendente; se ele sumir, o lease expira e a unidade volta para
+a fila. As decisões em si continuam indo para o diário, que é de onde os
+outros revisores puxam as replicações.
+"""
+import sqlite3
+import threading
+import time
+
+# Por quanto tempo (s) uma unidade fica reservada sem o revisor dar sinal
+DURACAO_LEASE = 5 * 60
+
+
+class FilaCompartilhada:
+    """Fila de unidades pendentes com leases, guardada num SQLite local."""
+
+    def __init__(self, caminho):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(caminho, check_same_thread=False, timeout=10, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS fila (
+                arquivo TEXT NOT NULL,
+                unidade INTEGER NOT NULL,
+                concluida INTEGER NOT NULL DEFAULT 0,
+                revisor TEXT,
+                lease_expira REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (arquivo, unidade)
+            );
+        """)
+
+    def popular(self, arquivo, unidades):
+        """Cadastra as unidades pendentes (as já cadastradas ficam como estão)."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO fila (arquivo, unidade) VALUES (?, ?)",
+                [(arquivo, int(u)) for u in unidades],
+            )
+            self._conn.execute("COMMIT")
+
+    def arrendar(self, arquivo, revisor, inicio=0, duracao=DURACAO_LEASE):
+        """Reserva para o revisor a próxima unidade livre a partir de `inicio`.
+
+        Se o revisor já tem uma unidade reservada a partir de `inicio`, o
+        lease dela é renovado. Retorna a unidade ou None se a fila acabou.
+        """
+        agora = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                linha = self._conn.execute(
+                    "SELECT unidade FROM fila WHERE arquivo = ? AND concluida = 0 AND unidade >= ? "
+                    "AND (revisor = ? OR revisor IS NULL OR lease_expira < ?) "
+                    "ORDER BY (revisor IS NOT ? OR lease_expira < ?), unidade LIMIT 1",
+                    (arquivo, inicio, revisor, agora, revisor, agora),
+                ).fetchone()
+                if linha is None and inicio > 0:
+                    # Chegou ao fim: recomeça do início para pegar o que sobrou
+                    linha = self._conn.execute(
+                        "SELECT unidade FROM fila WHERE arquivo = ? AND concluida = 0 "
+                        "AND (revisor = ? OR revisor IS NULL OR lease_expira < ?) ORDER BY unidade LIMIT 1",
+                        (arquivo, revisor, agora),
+                    ).fetchone()
+                # Um revisor segura só uma unidade por vez
+                self._conn.execute(
+                    "UPDATE fila SET revisor = NULL, lease_expira = 0 WHERE arquivo = ? AND revisor = ?",
+                    (arquivo, revisor),
+                )
+                if linha is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE fila SET revisor = ?, lease_expira = ? WHERE arquivo = ? AND unidade = ?",
+                    (revisor, agora + duracao, arquivo, linha[0]),
+                )
+                self._conn.execute("COMMIT")
+                return linha[0]
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def concluir(self, arquivo, unidade):
+        """Marca a unidade como validada (por qualquer revisor)."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE fila SET concluida = 1, revisor = NULL, lease_expira = 0 WHERE arquivo = ? AND unidade = ?",
+                (arquivo, int(unidade)),
+            )
+
+    def resumo(self, arquivo):
+        """Retorna (concluídas, total, revisores ativos)."""
+        agora = time.time()
+        with self._lock:
+            concluidas, total = self._conn.execute(
+                "SELECT COALESCE(SUM(concluida), 0), COUNT(*) FROM fila WHERE arquivo = ?", (arquivo,)
+            ).fetchone()
+            ativos = self._conn.execute(
+                "SELECT COUNT(DISTINCT revisor) FROM fila WHERE arquivo = ? AND revisor IS NOT NULL AND lease_expira >= ?",
+                (arquivo, agora),
+            ).fetchone()[0]
+        return concluidas, total, ativos
@@ -0,0 +1,145 @@
+"""Hashes perceptuais das imagens e busca de imagens parecidas.
+
+Cada imagem decodificada ganha três hashes de 64 bits (aHash, dHash e
+pHash), guardados num SQLite. Para achar vizinhas por distância de Hamming
+sem comparar com todas, o pHash é dividido em 4 blocos de 16 bits
+(multi-index hashing): se duas imagens diferem em até `d` bits, algum bloco
+difere em até `d // 4`, então basta olhar as variações próximas de cada
+bloco nas tabelas.
+"""
+import os
+import sqlite3
+import threading
+from functools import lru_cache
+from itertools import combinations
+
+import numpy as np
+from PIL import Image
+
+CAMINHO_PADRAO = os.environ.get("VALIDADOR_HASHES", ".hashes_imagens.sqlite3")
+
+# Distância de Hamming (em 64 bits de pHash) para considerar "mesma imagem"
+DISTANCIA_MAXIMA = 8
+
+BLOCOS = 4
+BITS_BLOCO = 64 // BLOCOS
+_MASCARA_BLOCO = (1 << BITS_BLOCO) - 1
+_MASCARA_64 = (1 << 64) - 1
+
+
+def _bits_para_int(bits):
+    return int(np.packbits(bits.astype(bool).ravel()).view('>u8')[0])
+
+
+def _matriz_dct(n):
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    return np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+
+
+_DCT32 = _matriz_dct(32)
+
+
+def calcular_hashes(img):
+    """Retorna (ahash, dhash, phash) da imagem, como inteiros de 64 bits."""
+    cinza = img.convert('L')
+
+    pequena = np.asarray(cinza.resize((8, 8), Image.Resampling.BOX), dtype=np.float64)
+    ahash = _bits_para_int(pequena > pequena.mean())
+
+    larga = np.asarray(cinza.resize((9, 8), Image.Resampling.BOX), dtype=np.float64)
+    dhash = _bits_para_int(larga[:, 1:] > larga[:, :-1])
+
+    amostra = np.asarray(cinza.resize((32, 32), Image.Resampling.LANCZOS), dtype=np.float64)
+    baixas = (_DCT32 @ amostra @ _DCT32.T)[:8, :8]
+    phash = _bits_para_int(baixas > np.median(baixas))
+
+    return ahash, dhash, phash
+
+
+def distancia(a, b):
+    """Distância de Hamming entre dois hashes."""
+    return (a ^ b).bit_count()
+
+
+@lru_cache(maxsize=None)
+def _mascaras(raio):
+    """Todas as máscaras de BITS_BLOCO bits com até `raio` bits ligados."""
+    mascaras = [0]
+    for r in range(1, raio + 1):
+        for posicoes in combinations(range(BITS_BLOCO), r):
+            mascaras.append(sum(1 << p for p in posicoes))
+    return mascaras
+
+
+def _com_sinal(valor):
+    # SQLite guarda INTEGER de 64 bits com sinal
+    return valor - (1 << 64) if valor >= (1 << 63) else valor
+
+
+class IndiceHashes:
+    """Índice persistente de pHash por URL, com busca por vizinhas."""
+
+    def __init__(self, caminho):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(caminho, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS hashes (
+                url TEXT PRIMARY KEY,
+                ahash INTEGER NOT NULL,
+                dhash INTEGER NOT NULL,
+                phash INTEGER NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+        self._phash = {}
+        self._tabelas = [{} for _ in range(BLOCOS)]
+        for url, phash in self._conn.execute("SELECT url, phash FROM hashes"):
+            self._indexar(url, phash & _MASCARA_64)
+
+    def __len__(self):
+        return len(self._phash)
+
+    def __contains__(self, url):
+        return url in self._phash
+
+    def _indexar(self, url, phash):
+        anterior = self._phash.get(url)
+        if anterior is not None:
+            for b in range(BLOCOS):
+                self._tabelas[b][(anterior >> (BITS_BLOCO * b)) & _MASCARA_BLOCO].discard(url)
+        self._phash[url] = phash
+        for b in range(BLOCOS):
+            self._tabelas[b].setdefault((phash >> (BITS_BLOCO * b)) & _MASCARA_BLOCO, set()).add(url)
+
+    def adicionar(self, url, img):
+        """Calcula e guarda os hashes da imagem (ignora URLs já indexadas)."""
+        if url in self._phash:
+            return
+        ahash, dhash, phash = calcular_hashes(img)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO hashes (url, ahash, dhash, phash) VALUES (?, ?, ?, ?)",
+                (url, _com_sinal(ahash), _com_sinal(dhash), _com_sinal(phash)),
+            )
+            self._conn.commit()
+            self._indexar(url, phash)
+
+    def vizinhos(self, url, distancia_max=DISTANCIA_MAXIMA):
+        """Lista (url, distância) das imagens parecidas, da mais próxima à mais distante."""
+        with self._lock:
+            phash = self._phash.get(url)
+            if phash is None:
+                return []
+            candidatos = set()
+            for b in range(BLOCOS):
+                tabela = self._tabelas[b]
+                bloco = (phash >> (BITS_BLOCO * b)) & _MASCARA_BLOCO
+                for mascara in _mascaras(distancia_max // BLOCOS):
+                    candidatos.update(tabela.get(bloco ^ mascara, ()))
+            candidatos.discard(url)
+            encontrados = [(c, distancia(phash, self._phash[c])) for c in candidatos]
+        return sorted((par for par in encontrados if par[1] <= distancia_max), key=lambda par: par[1])
@@ -0,0 +1,104 @@
+"""Sessão HTTP compartilhada para baixar as imagens.
+
+Uma única `requests.Session` com pool de conexões (keep-alive) evita um
+handshake TCP+TLS novo por imagem. Erros transitórios (conexão, 5xx) são
+repetidos com backoff exponencial e jitter, e um limitador por host faz o
+carregamento da tela e a pré-busca dividirem as mesmas vagas de conexão.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metricas import metricas
+
+# (conexão, leitura) em segundos
+TIMEOUT = (3.05, 20)
+
+# Requisições simultâneas por host (tela + pré-busca + triagem no mesmo processo)
+LIMITE_POR_HOST = int(os.environ.get("VALIDADOR_LIMITE_POR_HOST", "8"))
+
+_sessao = None
+_lock_sessao = threading.Lock()
+
+
+def _criar_sessao():
+    tentativas = Retry(
+        total=3,
+        connect=3,
+        read=False,  # timeout de leitura não repete: a tela já esperou o bastante
+        status=2,
+        backoff_factor=0.3,
+        backoff_jitter=0.3,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+        respect_retry_after_header=True,
+        # Devolve a última resposta 5xx em vez de levantar RetryError
+        raise_on_status=False,
+    )
+    adaptador = HTTPAdapter(pool_connections=8, pool_maxsize=32, max_retries=tentativas)
+    sessao = requests.Session()
+    sessao.mount("https://", adaptador)
+    sessao.mount("http://", adaptador)
+    return sessao
+
+
+def obter_sessao():
+    """Sessão HTTP do processo, criada no primeiro uso."""
+    global _sessao
+    if _sessao is None:
+        with _lock_sessao:
+            if _sessao is None:
+                _sessao = _criar_sessao()
+    return _sessao
+
+
+class LimitadorHosts:
+    """Semáforo por host, para não abrir conexões demais no mesmo servidor."""
+
+    def __init__(self, limite):
+        self.limite = limite
+        self._semaforos = {}
+        self._lock = threading.Lock()
+
+    def definir_limite(self, limite):
+        """Troca o limite (vale para hosts ainda não usados)."""
+        with self._lock:
+            self.limite = limite
+            self._semaforos.clear()
+
+    @contextmanager
+    def vaga(self, url):
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            semaforo = self._semaforos.get(host)
+            if semaforo is None:
+                semaforo = self._semaforos[host] = threading.BoundedSemaphore(self.limite)
+        with semaforo:
+            yield
+
+
+limitador = LimitadorHosts(LIMITE_POR_HOST)
+
+
+def get(url, headers=None, timeout=TIMEOUT):
+    """GET pela sessão compartilhada, respeitando o limite por host."""
+    if not metricas.ativo:
+        with limitador.vaga(url):
+            return obter_sessao().get(url, headers=headers, timeout=timeout, allow_redirects=True, verify=True)
+
+    # Com métricas: espera pela vaga, conexão + primeiro byte e corpo medidos à parte
+    inicio = time.perf_counter()
+    with limitador.vaga(url):
+        metricas.registrar("fetch_fila_host", (time.perf_counter() - inicio) * 1000)
+        resposta = obter_sessao().get(url, headers=headers, timeout=timeout, allow_redirects=True, verify=True,
+                                      stream=True)
+        metricas.registrar("fetch_conexao_ttfb", resposta.elapsed.total_seconds() * 1000)
+        with metricas.etapa("fetch_corpo"):
+            resposta.content  # lê o corpo aqui, para medir o download separado do TTFB
+    return resposta
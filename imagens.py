@@ -0,0 +1,243 @@
+"""Carregamento das imagens de validação e pré-busca em segundo plano."""
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from io import BytesIO
+
+import pandas as pd
+import requests
+from PIL import Image, ImageOps, features
+
+import http_cliente
+from metricas import metricas
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8',
+}
+
+POSSIVEIS_URLS = ['URL_Imagem', 'url_imagem', 'URL', 'url', 'link', 'Link', 'image_url', 'imagem']
+
+# Caixa máxima da miniatura exibida (a proporção da foto é mantida)
+LARGURA_EXIBICAO = 360
+ALTURA_EXIBICAO = int(LARGURA_EXIBICAO * 16 / 9)
+
+# Miniaturas vão para o navegador já codificadas
+FORMATO_MINIATURA = "WEBP" if features.check("webp") else "JPEG"
+QUALIDADE_MINIATURA = 80
+
+
+def detectar_coluna_url(df):
+    """Retorna o nome da coluna com as URLs das imagens, ou None."""
+    for col in POSSIVEIS_URLS:
+        if col in df.columns:
+            return col
+
+    for col in df.columns:
+        if 'url' in col.lower() or 'link' in col.lower():
+            return col
+
+    for col in df.columns:
+        amostra = str(df[col].iloc[0]) if len(df) > 0 else ""
+        if amostra.startswith('http://') or amostra.startswith('https://'):
+            return col
+
+    return None
+
+
+def normalizar_url(valor):
+    """Converte o valor da célula em uma URL utilizável ("" se vazia)."""
+    if pd.isna(valor):
+        return ""
+    url = str(valor).strip()
+    if not url or url.lower() == "nan":
+        return ""
+    if not (url.startswith("http://") or url.startswith("https://")):
+        url = "https://" + url
+    return url
+
+
+@dataclass
+class RespostaImagem:
+    conteudo: bytes | None
+    erro: str
+    status: int | None = None
+    content_type: str | None = None
+
+
+def buscar_imagem(url, cache=None, timeout=http_cliente.TIMEOUT, repetir_falha=False):
+    """Baixa a imagem, passando pelo cache em disco se houver.
+
+    Retorna uma RespostaImagem com os bytes (ou None) e a mensagem de erro
+    (ou ""). Erros também são guardados no cache, com validade curta para
+    os transitórios (timeout, conexão, 5xx); se um transitório acontece ao
+    revalidar uma imagem vencida, a imagem guardada é usada e mantida. Com
+    `repetir_falha`, um erro guardado não é reaproveitado: o download é
+    tentado de novo (botão "Tentar de novo" do app).
+    """
+    with metricas.etapa("cache_consulta"):
+        entrada = cache.consultar(url) if cache else None
+    if entrada and entrada.fresca and not (repetir_falha and entrada.conteudo is None):
+        return RespostaImagem(entrada.conteudo, entrada.erro, entrada.status, entrada.content_type)
+
+    headers = dict(HEADERS)
+    if entrada and entrada.conteudo is not None:
+        if entrada.etag:
+            headers['If-None-Match'] = entrada.etag
+        if entrada.last_modified:
+            headers['If-Modified-Since'] = entrada.last_modified
+
+    transitorio = True
+    status = None
+    content_type = None
+    try:
+        response = http_cliente.get(url, headers=headers, timeout=timeout)
+        status = response.status_code
+        if status == 304 and entrada and entrada.conteudo is not None:
+            cache.revalidar(url)
+            return RespostaImagem(entrada.conteudo, "", entrada.status, entrada.content_type)
+        response.raise_for_status()
+
+        content_type = response.headers.get('content-type', '')
+        if 'image' not in content_type.lower() and len(response.content) < 100:
+            erro = f"URL não retorna imagem válida (tipo: {content_type})"
+            transitorio = False
+        else:
+            if cache:
+                cache.guardar(url, response.content,
+                              etag=response.headers.get('ETag'),
+                              last_modified=response.headers.get('Last-Modified'),
+                              status=status, content_type=content_type)
+            return RespostaImagem(response.content, "", status, content_type)
+
+    except requests.exceptions.Timeout:
+        erro = "⏱️ Timeout: Servidor demorou muito para responder"
+    except requests.exceptions.ConnectionError:
+        erro = "🔌 Erro de conexão: Não foi possível conectar ao servidor"
+    except requests.exceptions.HTTPError as e:
+        erro = f"❌ HTTP {e.response.status_code}: {e.response.reason}"
+        transitorio = e.response.status_code >= 500
+    except Exception as e:
+        erro = f"⚠️ Erro: {str(e)[:100]}"
+
+    if transitorio and entrada and entrada.conteudo is not None:
+        # Revalidação falhou por um problema passageiro: a cópia guardada continua
+        # valendo (e fica no cache) até o servidor responder de novo
+        return RespostaImagem(entrada.conteudo, "", entrada.status, entrada.content_type)
+    if cache:
+        cache.guardar_erro(url, erro, transitorio=transitorio, status=status, content_type=content_type)
+    return RespostaImagem(None, erro, status, content_type)
+
+
+def baixar_conteudo(url, cache=None, repetir_falha=False):
+    """Atalho de `buscar_imagem` que retorna só (conteudo, erro)."""
+    resposta = buscar_imagem(url, cache, repetir_falha=repetir_falha)
+    return resposta.conteudo, resposta.erro
+
+
+def gerar_miniatura(conteudo):
+    """Decodifica os bytes já reduzidos e retorna a miniatura (PIL) para exibição.
+
+    Em JPEG, `draft` faz o decodificador entregar direto uma versão em
+    escala 1/2, 1/4 ou 1/8, sem decodificar a foto inteira; a orientação
+    EXIF é aplicada e a proporção original é mantida.
+    """
+    with metricas.etapa("decodificacao"):
+        img = Image.open(BytesIO(conteudo))
+        # Caixa quadrada: a orientação EXIF pode trocar largura e altura
+        lado = max(LARGURA_EXIBICAO, ALTURA_EXIBICAO)
+        img.draft('RGB', (lado, lado))
+        img.load()
+    with metricas.etapa("redimensionamento"):
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        img.thumbnail((LARGURA_EXIBICAO, ALTURA_EXIBICAO), Image.Resampling.LANCZOS, reducing_gap=2.0)
+    return img
+
+
+def codificar_miniatura(img):
+    """Codifica a miniatura (WebP, ou JPEG se não houver suporte) em bytes."""
+    buffer = BytesIO()
+    with metricas.etapa("codificacao"):
+        img.save(buffer, FORMATO_MINIATURA, quality=QUALIDADE_MINIATURA)
+    return buffer.getvalue()
+
+
+def carregar_imagem(url, cache=None, indice_hashes=None, repetir_falha=False):
+    """Baixa a imagem e gera a miniatura de exibição.
+
+    Retorna uma tupla (miniatura, erro): os bytes da miniatura codificada ou
+    None, e a mensagem de erro ou "". Com `indice_hashes`, a imagem também
+    entra no índice de hashes perceptuais.
+    """
+    conteudo, erro = baixar_conteudo(url, cache, repetir_falha)
+    if conteudo is None:
+        return None, erro
+
+    try:
+        img = gerar_miniatura(conteudo)
+        if indice_hashes is not None:
+            with metricas.etapa("hash_perceptual"):
+                indice_hashes.adicionar(url, img)
+        return codificar_miniatura(img), ""
+    except Exception as e:
+        return None, f"⚠️ Erro: {str(e)[:100]}"
+
+
+class PreBuscaImagens:
+    """Pool de threads que carrega imagens antecipadamente.
+
+    Os resultados (miniaturas já codificadas, poucos KB cada) ficam num
+    cache LRU limitado (por URL) que sobrevive aos reruns do Streamlit,
+    então ao avançar a próxima imagem já está pronta.
+    Falhas não ficam na memória: o cache em disco já controla por quanto
+    tempo um erro é reaproveitado.
+    """
+
+    def __init__(self, cache=None, indice_hashes=None, max_workers=4, capacidade=256):
+        self.cache = cache
+        self.indice_hashes = indice_hashes
+        self.capacidade = capacidade
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prebusca")
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _guardar(self, url, futuro):
+        self._cache[url] = futuro
+        self._cache.move_to_end(url)
+        while len(self._cache) > self.capacidade:
+            _, antigo = self._cache.popitem(last=False)
+            antigo.cancel()
+
+    def agendar(self, url):
+        """Coloca a URL na fila de pré-busca (se ainda não estiver no cache)."""
+        with self._lock:
+            futuro = self._cache.get(url)
+            if futuro is None:
+                futuro = self._executor.submit(carregar_imagem, url, self.cache, self.indice_hashes)
+                self._guardar(url, futuro)
+            else:
+                self._cache.move_to_end(url)
+            return futuro
+
+    def obter(self, url, repetir_falha=False):
+        """Retorna (miniatura, erro) para a URL, esperando a pré-busca se preciso.
+
+        Se a URL ainda estiver parada na fila, carrega direto na thread atual
+        para que a imagem da tela não espere as que vêm depois. Com
+        `repetir_falha`, carrega direto ignorando um erro guardado no cache.
+        """
+        futuro = None if repetir_falha else self.agendar(url)
+        if futuro is None or futuro.cancel():
+            futuro = Future()
+            futuro.set_result(carregar_imagem(url, self.cache, self.indice_hashes, repetir_falha))
+            with self._lock:
+                self._guardar(url, futuro)
+        img, erro = futuro.result()
+        if img is None:
+            with self._lock:
+                if self._cache.get(url) is futuro:
+                    del self._cache[url]
+        return img, erro
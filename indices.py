@@ -0,0 +1,488 @@
+"""Índices pré-calculados sobre o DataFrame carregado."""
+import numpy as np
+import pandas as pd
+
+
+def normalizar_texto(serie):
+    """Versão vetorizada de `str(valor).strip()`, com NaN virando ""."""
+    return serie.astype(str).str.strip().where(serie.notna(), "")
+
+
+class IndiceGrupos:
+    """Linhas agrupadas por (URL, Categoria) normalizados.
+
+    Construído uma vez no upload: `codigos[i]` é o grupo da linha i (-1 se
+    faltar URL ou Categoria) e as posições de cada grupo ficam contíguas em
+    `_ordem`, então buscar os membros de um grupo não percorre o DataFrame.
+    """
+
+    def __init__(self, df, col_url, col_categoria):
+        n = len(df)
+        if not col_url or not col_categoria:
+            self.codigos = np.full(n, -1, dtype=np.int64)
+            self._ordem = np.arange(n)
+            self._inicios = np.zeros(1, dtype=np.int64)
+            return
+
+        url = normalizar_texto(df[col_url])
+        cat = normalizar_texto(df[col_categoria])
+        validos = (url != "") & (cat != "")
+        chave = (url + "\x1f" + cat).where(validos)
+        codigos, _ = pd.factorize(chave, use_na_sentinel=True)
+        self.codigos = codigos.astype(np.int64)
+
+        # Posições ordenadas por grupo; _inicios[g] marca onde o grupo g começa
+        self._ordem = np.argsort(self.codigos, kind="stable")
+        total_grupos = int(self.codigos.max()) + 1 if n else 0
+        self._inicios = np.searchsorted(self.codigos[self._ordem], np.arange(total_grupos + 1))
+
+    def membros(self, posicao):
+        """Posições de todas as linhas do mesmo grupo (inclui a própria)."""
+        grupo = self.codigos[posicao]
+        if grupo < 0:
+            return np.array([posicao])
+        return self._ordem[self._inicios[grupo]:self._inicios[grupo + 1]]
+
+    def unidade(self, posicao):
+        """Primeira linha do grupo da posição (a própria, se não tiver grupo)."""
+        return int(self.membros(posicao)[0])
+
+    def unidades(self, posicoes):
+        """Versão vetorizada de `unidade`."""
+        posicoes = np.asarray(posicoes)
+        if len(self._inicios) < 2:
+            return posicoes
+        primeiras = self._ordem[self._inicios[:-1]]
+        grupos = self.codigos[posicoes]
+        return np.where(grupos >= 0, primeiras[np.maximum(grupos, 0)], posicoes)
+
+    def tamanhos(self, posicoes):
+        """Quantidade de linhas no grupo de cada posição (1 para linhas sem grupo)."""
+        posicoes = np.asarray(posicoes)
+        por_grupo = np.diff(self._inicios)
+        if not len(por_grupo):
+            return np.ones(len(posicoes), dtype=np.int64)
+        grupos = self.codigos[posicoes]
+        return np.where(grupos >= 0, por_grupo[np.maximum(grupos, 0)], 1)
+
+
+class IndiceValores:
+    """Posições das linhas por valor de uma coluna, sem varrer o DataFrame a cada busca."""
+
+    def __init__(self, serie):
+        codigos, valores = pd.factorize(serie)
+        self._valores = pd.Index(valores)
+        self.codigos = codigos.astype(np.int64)
+        self._ordem = np.argsort(self.codigos, kind="stable")
+        self._inicios = np.searchsorted(self.codigos[self._ordem], np.arange(len(self._valores) + 1))
+
+    def posicoes(self, valores):
+        """Posições (em ordem crescente) das linhas com algum dos `valores`."""
+        codigos = self._valores.get_indexer(valores)
+        partes = [self._ordem[self._inicios[c]:self._inicios[c + 1]] for c in codigos if c >= 0]
+        if not partes:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(partes))
+
+    def valores(self, posicoes):
+        """Valor de cada posição."""
+        return self._valores.take(self.codigos[posicoes])
+
+    def distintos(self):
+        """Valores distintos, em ordem alfabética."""
+        return sorted(self._valores.astype(str))
+
+    def postos(self):
+        """Posto de cada linha na ordem alfabética do valor (vazios por último)."""
+        ordem_valores = np.argsort(np.asarray(self._valores.astype(str)), kind="stable")
+        posto_do_valor = np.empty(len(ordem_valores) + 1, dtype=np.int64)
+        posto_do_valor[ordem_valores] = np.arange(len(ordem_valores))
+        posto_do_valor[-1] = len(ordem_valores)
+        # Código -1 (vazio) cai no último elemento
+        return posto_do_valor[self.codigos]
+
+
+# Critérios de ordenação da revisão por grupo
+POR_TAMANHO = "Tamanho do grupo"
+POR_CATEGORIA = "Categoria"
+
+
+class VisaoGrupos:
+    """Visão deduplicada para revisar um grupo (URL + Categoria) por vez.
+
+    `unidades[k]` é a primeira linha do k-ésimo grupo na ordem de revisão:
+    maiores grupos primeiro ou, por Categoria, maiores grupos primeiro dentro
+    de cada Categoria. Linhas sem grupo entram como grupos de uma linha só.
+    """
+
+    def __init__(self, grupos, criterio=POR_TAMANHO, categorias=None):
+        self.grupos = grupos
+        n = len(grupos.codigos)
+        todas = np.arange(n)
+        unidades = np.flatnonzero(grupos.unidades(todas) == todas)
+        self.tamanhos = grupos.tamanhos(unidades)
+        chaves = [unidades, -self.tamanhos]
+        if criterio == POR_CATEGORIA and categorias is not None:
+            codigos_cat, _ = pd.factorize(normalizar_texto(categorias).iloc[unidades], sort=True)
+            chaves.append(codigos_cat)
+        # lexsort ordena pela última chave primeiro
+        ordem = np.lexsort(chaves)
+        self.unidades = unidades[ordem]
+        self.tamanhos = self.tamanhos[ordem]
+        self._posicao_da_unidade = np.empty(n, dtype=np.int64)
+        self._posicao_da_unidade[self.unidades] = np.arange(len(self.unidades))
+
+    def __len__(self):
+        return len(self.unidades)
+
+    def unidades_de(self, linhas):
+        """Grupos (primeiras linhas) das `linhas`, sem repetição e na ordem de revisão."""
+        posicoes = np.unique(self._posicao_da_unidade[self.grupos.unidades(linhas)])
+        return self.unidades[posicoes]
+
+
+class OrdemNavegacao:
+    """Sequência de revisão montada uma vez, percorrida por um cursor.
+
+    Avançar e voltar só mexem no cursor; itens que ficaram concluídos no
+    caminho (replicação, outro revisor) são pulados ao avançar, cada um no
+    máximo uma vez. Voltar para num item já concluído, para corrigi-lo.
+    """
+
+    def __init__(self, posicoes):
+        self.posicoes = np.asarray(posicoes, dtype=np.int64)
+        self.cursor = 0
+
+    def __len__(self):
+        return len(self.posicoes)
+
+    def atual(self):
+        """Item no cursor, ou None no fim da sequência."""
+        if self.cursor < len(self.posicoes):
+            return int(self.posicoes[self.cursor])
+        return None
+
+    def pular_concluidos(self, concluido):
+        while self.cursor < len(self.posicoes) and concluido(int(self.posicoes[self.cursor])):
+            self.cursor += 1
+
+    def avancar(self, concluido):
+        self.cursor += 1
+        self.pular_concluidos(concluido)
+
+    def voltar(self):
+        self.cursor = max(self.cursor - 1, 0)
+
+    def proximas(self, quantidade):
+        """Itens logo depois do cursor (para pré-busca)."""
+        return self.posicoes[self.cursor + 1:self.cursor + 1 + quantidade]
+
+
+# Códigos de situação de cada linha em EstadoValidacao
+PENDENTE, SIM, NAO, OUTRO = 0, 1, 2, 3
+
+
+def _codigo_resultado(valor):
+    if valor == 'SIM':
+        return SIM
+    if valor == 'NÃO':
+        return NAO
+    return OUTRO
+
+
+class EstadoValidacao:
+    """Situação de validação de cada linha, com contadores mantidos a cada save.
+
+    Calculado uma vez com operações vetorizadas no upload; depois `marcar`
+    atualiza só as linhas afetadas, então progresso e estatísticas finais não precisam reprocessar o DataFrame.
+    """
+
+    def __init__(self, serie_valida):
+        valores = normalizar_texto(serie_valida)
+        self.codigos = np.full(len(valores), OUTRO, dtype=np.int8)
+        self.codigos[valores.isin(["", "nan"]).to_numpy()] = PENDENTE
+        self.codigos[(valores == 'SIM').to_numpy()] = SIM
+        self.codigos[(valores == 'NÃO').to_numpy()] = NAO
+        self.contagem = np.bincount(self.codigos, minlength=4)
+        # Incrementada a cada alteração; usada para invalidar exportações
+        self.versao = 0
+        # Posições alteradas em cada versão ainda não aplicada por todas as
+        # filas de revisão; alteracoes[0] é a versão descartadas + 1
+        self.alteracoes = []
+        self.descartadas = 0
+
+    @property
+    def validadas(self):
+        return self.codigos != PENDENTE
+
+    @property
+    def total_validadas(self):
+        return int(len(self.codigos) - self.contagem[PENDENTE])
+
+    @property
+    def total_sim(self):
+        return int(self.contagem[SIM])
+
+    @property
+    def total_nao(self):
+        return int(self.contagem[NAO])
+
+    def esta_validada(self, posicao):
+        return self.codigos[posicao] != PENDENTE
+
+    def marcar(self, posicoes, resultado):
+        """Registra `resultado` ('SIM'/'NÃO') nas posições, ajustando os contadores."""
+        posicoes = np.atleast_1d(posicoes)
+        if not len(posicoes):
+            return
+        self.contagem -= np.bincount(self.codigos[posicoes], minlength=4)
+        self.codigos[posicoes] = _codigo_resultado(resultado)
+        self.contagem[self.codigos[posicoes[0]]] += len(posicoes)
+        self.versao += 1
+        self.alteracoes.append(posicoes.copy())
+
+    def alteracoes_desde(self, versao):
+        """Posições alteradas em cada versão posterior a `versao`."""
+        return self.alteracoes[versao - self.descartadas:]
+
+    def descartar_ate(self, versao):
+        """Esquece as alterações até `versao`, já aplicadas por todas as filas vivas."""
+        self.alteracoes = self.alteracoes[versao - self.descartadas:]
+        self.descartadas = versao
+
+
+# Ordem da fila filtrada: a da revisão (arquivo ou grupos), por uma coluna ou pela sugestão da triagem
+ORDEM_PADRAO = "Ordem padrão"
+COLUNAS_FILTRO = ["Categoria", "CNPJ", "Data"]
+ORDEM_SUGESTAO = "Sugestão (mais confiantes primeiro)"
+
+
+class IndiceSugestoes:
+    """Sugestões da triagem (Valida, Motivo, confiança), das mais confiantes para as menos.
+
+    `linhas` tem só as linhas com sugestão, em ordem decrescente de
+    confiança, então "todas acima de x" é um prefixo achado por busca binária.
+    """
+
+    def __init__(self, df):
+        confianca = pd.to_numeric(df["Sugestao_Confianca"], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+        # Mesma confiança (mesma regra): motivos iguais ficam juntos
+        valida = pd.Categorical(df["Sugestao_Valida"])
+        motivo = pd.Categorical(df["Sugestao_Motivo"])
+        ordem = np.lexsort((motivo.codes, valida.codes, -confianca))
+        self.postos = np.empty(len(ordem), dtype=np.int64)
+        self.postos[ordem] = np.arange(len(ordem))
+        # -NaN também vai para o fim da ordenação
+        self.linhas = ordem[:int(np.count_nonzero(~np.isnan(confianca)))]
+        self._confiancas_negativas = -confianca[self.linhas]
+        self._confianca = confianca
+        # Código -1 (vazio) cai no "" acrescentado ao fim das categorias
+        self._valida = (valida.codes, np.append(np.asarray(valida.categories, dtype=object), ""))
+        self._motivo = (motivo.codes, np.append(np.asarray(motivo.categories, dtype=object), ""))
+
+    def __len__(self):
+        return len(self.linhas)
+
+    def acima_de(self, minima):
+        """Linhas com confiança >= `minima`, das mais confiantes para as menos."""
+        return self.linhas[:np.searchsorted(self._confiancas_negativas, -minima, side="right")]
+
+    def valores(self, linhas):
+        """(valida, motivo) sugeridos para cada linha."""
+        return tuple(categorias[codigos[linhas]] for codigos, categorias in (self._valida, self._motivo))
+
+    def sugestao(self, linha):
+        """(valida, motivo, confiança) da linha, ou None sem sugestão."""
+        if np.isnan(self._confianca[linha]):
+            return None
+        valida, motivo = self.valores(np.array([linha]))
+        return str(valida[0]), str(motivo[0]), float(self._confianca[linha])
+
+
+class IndicesFiltro:
+    """Índices de Categoria, CNPJ e Data para filtrar e ordenar a fila de revisão.
+
+    Montados uma vez no upload: Categoria e CNPJ guardam as posições de cada
+    valor e a Data fica ordenada, então um período sai de duas buscas
+    binárias. Trocar o filtro só combina esses arrays, sem varrer o DataFrame.
+    """
+
+    def __init__(self, df):
+        self.valores = {col: IndiceValores(df[col]) for col in ("Categoria", "CNPJ") if col in df.columns}
+        self.postos = {col: indice.postos() for col, indice in self.valores.items()}
+        self.datas = None
+        if "Data" in df.columns and pd.api.types.is_datetime64_any_dtype(df["Data"]):
+            datas = df["Data"].to_numpy()
+            # NaT vai para o fim da ordenação
+            ordem = np.argsort(datas, kind="stable")
+            self._ordem_datas = ordem[:int(np.count_nonzero(~np.isnat(datas)))]
+            self.datas = datas[self._ordem_datas]
+            self.postos["Data"] = np.empty(len(ordem), dtype=np.int64)
+            self.postos["Data"][ordem] = np.arange(len(ordem))
+        self.sugestoes = None
+        if "Sugestao_Confianca" in df.columns:
+            self.sugestoes = IndiceSugestoes(df)
+            self.postos[ORDEM_SUGESTAO] = self.sugestoes.postos
+
+    def periodo_disponivel(self):
+        """(primeira, última) Data do arquivo, ou None sem coluna de data."""
+        if self.datas is None or not len(self.datas):
+            return None
+        return pd.Timestamp(self.datas[0]).date(), pd.Timestamp(self.datas[-1]).date()
+
+    def filtrar(self, categorias=(), cnpjs=(), periodo=None):
+        """Posições (crescentes) que passam em todos os filtros ativos; None sem filtro."""
+        partes = []
+        for col, escolhidos in (("Categoria", categorias), ("CNPJ", cnpjs)):
+            if escolhidos and col in self.valores:
+                partes.append(self.valores[col].posicoes(list(escolhidos)))
+        if periodo is not None and self.datas is not None:
+            inicio = np.datetime64(periodo[0]).astype(self.datas.dtype)
+            fim = (np.datetime64(periodo[1]) + np.timedelta64(1, "D")).astype(self.datas.dtype)
+            a, b = np.searchsorted(self.datas, [inicio, fim])
+            partes.append(np.sort(self._ordem_datas[a:b]))
+        if not partes:
+            return None
+        partes.sort(key=len)
+        resultado = partes[0]
+        for parte in partes[1:]:
+            resultado = np.intersect1d(resultado, parte, assume_unique=True)
+        return resultado
+
+    def ordenar(self, posicoes, criterio):
+        """`posicoes` reordenadas pela coluna `criterio` (estável; ORDEM_PADRAO mantém)."""
+        if criterio not in self.postos:
+            return posicoes
+        return posicoes[np.argsort(self.postos[criterio][posicoes], kind="stable")]
+
+
+class ContagemPendentes:
+    """Árvore de Fenwick sobre "pendente ou não" de cada item de uma sequência.
+
+    Marcar um item e achar o próximo pendente a partir de uma posição custam
+    O(log n); a montagem é vetorizada (somas acumuladas).
+    """
+
+    def __init__(self, pendentes):
+        self.pendentes = np.array(pendentes, dtype=bool)
+        n = len(self.pendentes)
+        soma = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(self.pendentes, out=soma[1:])
+        i = np.arange(1, n + 1)
+        # Nó i cobre os itens (i - lowbit(i), i]
+        self._arvore = np.zeros(n + 1, dtype=np.int64)
+        self._arvore[1:] = soma[i] - soma[i - (i & -i)]
+        self.total = int(soma[-1])
+        self._passo_inicial = 1 << (n.bit_length() - 1) if n else 0
+
+    def __len__(self):
+        return len(self.pendentes)
+
+    def definir(self, posicao, pendente):
+        if self.pendentes[posicao] == pendente:
+            return
+        self.pendentes[posicao] = pendente
+        delta = 1 if pendente else -1
+        self.total += delta
+        i = posicao + 1
+        while i < len(self._arvore):
+            self._arvore[i] += delta
+            i += i & -i
+
+    def _antes(self, posicao):
+        """Pendentes nas posições [0, posicao)."""
+        soma = 0
+        i = posicao
+        while i > 0:
+            soma += self._arvore[i]
+            i -= i & -i
+        return int(soma)
+
+    def proxima(self, inicio):
+        """Primeira posição pendente a partir de `inicio` (len se não houver)."""
+        inicio = max(inicio, 0)
+        if inicio >= len(self.pendentes):
+            return len(self.pendentes)
+        if self.pendentes[inicio]:
+            return inicio
+        # Procura a menor posição com `alvo` pendentes até ela (inclusive)
+        alvo = self._antes(inicio) + 1
+        if alvo > self.total:
+            return len(self.pendentes)
+        posicao, passo = 0, self._passo_inicial
+        while passo:
+            seguinte = posicao + passo
+            if seguinte < len(self._arvore) and self._arvore[seguinte] < alvo:
+                posicao = seguinte
+                alvo -= self._arvore[seguinte]
+            passo >>= 1
+        return posicao
+
+
+class FilaRevisao:
+    """Fila de revisão (linhas ou grupos) já filtrada e ordenada.
+
+    Montada ao trocar filtro ou ordem; depois acompanha os saves pelo
+    histórico do `EstadoValidacao`, atualizando só os itens alterados. A
+    próxima pendente sai da árvore de Fenwick em O(log n) e o progresso da
+    fila é um contador.
+    """
+
+    def __init__(self, itens, estado, grupos=None, filtrada=False):
+        self.itens = np.asarray(itens, dtype=np.int64)
+        self.grupos = grupos
+        self.filtrada = filtrada
+        total_linhas = len(estado.codigos)
+        self._total_linhas = total_linhas
+        self._posicao_do_item = np.full(total_linhas, -1, dtype=np.int64)
+        self._posicao_do_item[self.itens] = np.arange(len(self.itens))
+        validadas = estado.validadas
+        if grupos is None:
+            pendentes = ~validadas[self.itens]
+        else:
+            unidades_pendentes = grupos.unidades(np.flatnonzero(~validadas))
+            pendentes = np.bincount(unidades_pendentes, minlength=total_linhas)[self.itens] > 0
+        self._pendentes = ContagemPendentes(pendentes)
+        self.versao = estado.versao
+
+    def __len__(self):
+        return len(self.itens)
+
+    @property
+    def total_concluidos(self):
+        return len(self.itens) - self._pendentes.total
+
+    def sincronizar(self, estado):
+        """Aplica os saves feitos desde a última sincronização."""
+        validadas = estado.validadas
+        for posicoes in estado.alteracoes_desde(self.versao):
+            itens = np.unique(self.grupos.unidades(posicoes) if self.grupos is not None else posicoes)
+            for item, posicao in zip(itens, self._posicao_do_item[itens]):
+                if posicao < 0:
+                    continue
+                if self.grupos is not None:
+                    pendente = not validadas[self.grupos.membros(int(item))].all()
+                else:
+                    pendente = not validadas[item]
+                self._pendentes.definir(int(posicao), pendente)
+        self.versao = estado.versao
+
+    def linha(self, posicao):
+        """Linha exibida na posição `posicao` da fila (len do DataFrame no fim)."""
+        if posicao < len(self.itens):
+            return int(self.itens[posicao])
+        return self._total_linhas
+
+    def posicao(self, linha):
+        """Posição do item da linha na fila, ou None se a linha ficou fora do filtro."""
+        item = self.grupos.unidade(linha) if self.grupos is not None else linha
+        posicao = int(self._posicao_do_item[item])
+        return posicao if posicao >= 0 else None
+
+    def proxima_pendente(self, inicio):
+        """Primeira posição a partir de `inicio` com item pendente (len se não houver)."""
+        return self._pendentes.proxima(inicio)
+
+    def itens_pendentes(self):
+        """Itens ainda pendentes, na ordem da fila."""
+        return self.itens[self._pendentes.pendentes]
@@ -0,0 +1,100 @@
+"""Cronômetros por etapa (download, decodificação, exportação...) para achar gargalos.
+
+Desligados por padrão: `etapa()` devolve um contexto vazio e o custo fica em
+uma chamada de função. Ligados (VALIDADOR_METRICAS=1 ou pelo Debug Info),
+guardam as últimas medições de cada etapa para p50/p95 e, com
+VALIDADOR_METRICAS_LOG, acrescentam uma linha JSON por medição no arquivo.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+import pandas as pd
+
+# Medições guardadas por etapa para os percentis
+JANELA = 500
+
+_NULO = nullcontext()
+
+
+class Metricas:
+    """Tempos por etapa, em milissegundos, compartilhados entre threads."""
+
+    def __init__(self, ativo=False, caminho_log=None, janela=JANELA):
+        self.ativo = ativo
+        self.caminho_log = caminho_log
+        self.janela = janela
+        self._recentes = {}
+        self._totais = {}
+        self._log = None
+        self._lock = threading.Lock()
+
+    def etapa(self, nome):
+        """Contexto que cronometra o bloco como a etapa `nome`."""
+        if not self.ativo:
+            return _NULO
+        return self._cronometrar(nome)
+
+    @contextmanager
+    def _cronometrar(self, nome):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(nome, (time.perf_counter() - inicio) * 1000)
+
+    def registrar(self, nome, ms):
+        """Acrescenta uma medição já feita (em ms)."""
+        if not self.ativo:
+            return
+        with self._lock:
+            recentes = self._recentes.get(nome)
+            if recentes is None:
+                recentes = self._recentes[nome] = deque(maxlen=self.janela)
+                self._totais[nome] = [0, 0.0]
+            recentes.append(ms)
+            self._totais[nome][0] += 1
+            self._totais[nome][1] += ms
+            if self.caminho_log:
+                if self._log is None:
+                    self._log = open(self.caminho_log, "a", encoding="utf-8", buffering=1)
+                self._log.write(json.dumps({"ts": round(time.time(), 3), "etapa": nome, "ms": round(ms, 3)}) + "\n")
+
+    def resumo(self):
+        """DataFrame com n, p50 e p95 (ms) das últimas medições de cada etapa."""
+        with self._lock:
+            recentes = {nome: np.fromiter(valores, dtype=float) for nome, valores in self._recentes.items()}
+        linhas = [
+            (nome, len(valores), *np.percentile(valores, [50, 95]))
+            for nome, valores in sorted(recentes.items())
+        ]
+        return pd.DataFrame(linhas, columns=["Etapa", "N", "p50 (ms)", "p95 (ms)"]).round(2)
+
+    def texto_prometheus(self):
+        """Resumo no formato texto do Prometheus (summary por etapa)."""
+        resumo = self.resumo()
+        with self._lock:
+            totais = {nome: tuple(valores) for nome, valores in self._totais.items()}
+        linhas = ["# TYPE validador_etapa_ms summary"]
+        for etapa, _, p50, p95 in resumo.itertuples(index=False):
+            rotulo = f'etapa="{etapa}"'
+            linhas.append(f'validador_etapa_ms{{{rotulo},quantile="0.5"}} {p50}')
+            linhas.append(f'validador_etapa_ms{{{rotulo},quantile="0.95"}} {p95}')
+            linhas.append(f"validador_etapa_ms_count{{{rotulo}}} {totais[etapa][0]}")
+            linhas.append(f"validador_etapa_ms_sum{{{rotulo}}} {round(totais[etapa][1], 3)}")
+        return "\n".join(linhas) + "\n"
+
+    def limpar(self):
+        with self._lock:
+            self._recentes.clear()
+            self._totais.clear()
+
+
+metricas = Metricas(
+    ativo=bool(os.environ.get("VALIDADOR_METRICAS") or os.environ.get("VALIDADOR_METRICAS_LOG")),
+    caminho_log=os.environ.get("VALIDADOR_METRICAS_LOG"),
+)
@@ -1,13 +1,72 @@
+import os
+import time
 import streamlit as st
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from PIL import Image
-import requests
-from io import BytesIO
+from cache_imagens import DIRETORIO_PADRAO, CacheDisco
+from caracteristicas import REVISAR
+from carregador import MOTIVOS_OPCOES, formatar_data, ler_planilha, preparar_colunas
+from diario import DiarioValidacao, GravacaoSegundoPlano, aplicar, gravar_decisao, hash_arquivo
+from exportacao import FORMATOS, CacheExportacao
+from fila_compartilhada import FilaCompartilhada
+from hash_perceptual import CAMINHO_PADRAO as HASHES_PATH, IndiceHashes
+from imagens import PreBuscaImagens, baixar_conteudo, detectar_coluna_url, normalizar_url
+from indices import (COLUNAS_FILTRO, ORDEM_PADRAO, ORDEM_SUGESTAO, POR_CATEGORIA, POR_TAMANHO, EstadoValidacao, FilaRevisao,
+                     IndiceGrupos, IndicesFiltro, IndiceValores, OrdemNavegacao, VisaoGrupos)
+from metricas import metricas
+
+# Quantas imagens pendentes à frente são carregadas em segundo plano
+PREBUSCA_QTD = 8
+# Limite do cache em disco das imagens baixadas (compartilhado entre sessões)
+CACHE_LIMITE_MB = int(os.environ.get("VALIDADOR_CACHE_LIMITE_MB", "500"))
+# Diário das validações, para retomar após refresh/queda do servidor
+DIARIO_PATH = os.environ.get("VALIDADOR_DIARIO", ".diario_validacao.sqlite3")
+# Fila de trabalho compartilhada entre revisores (por padrão no mesmo SQLite do diário)
+FILA_PATH = os.environ.get("VALIDADOR_FILA", DIARIO_PATH)
+# Tempo máximo esperado de um rerun (exibido no Debug Info)
+ORCAMENTO_RERUN_MS = 50
+
+inicio_rerun = time.perf_counter()
 
 st.set_page_config(page_title="Validação de Imagens", layout="wide")
 st.title("Validador de Imagens")
 
+
+@st.cache_resource
+def obter_indice_hashes():
+    return IndiceHashes(HASHES_PATH)
+
+
+@st.cache_resource
+def obter_prebusca():
+    return PreBuscaImagens(
+        cache=CacheDisco(DIRETORIO_PADRAO, limite_bytes=CACHE_LIMITE_MB * 1024 * 1024),
+        indice_hashes=obter_indice_hashes(),
+    )
+
+
+@st.cache_resource
+def obter_diario():
+    return DiarioValidacao(DIARIO_PATH)
+
+
+@st.cache_resource
+def obter_gravacao():
+    return GravacaoSegundoPlano(obter_diario())
+
+
+@st.cache_resource
+def obter_fila():
+    return FilaCompartilhada(FILA_PATH)
+
+
+indice_hashes = obter_indice_hashes()
+prebusca = obter_prebusca()
+diario = obter_diario()
+gravacao = obter_gravacao()
+fila = obter_fila()
+
 # Inicializar session_state
 if "indice" not in st.session_state:
     st.session_state.indice = 0
@@ -15,6 +74,40 @@ if "df" not in st.session_state:
     st.session_state.df = None
 if "uploaded_file_id" not in st.session_state:
     st.session_state.uploaded_file_id = None
+if "arquivo_hash" not in st.session_state:
+    st.session_state.arquivo_hash = None
+if "diario_seq" not in st.session_state:
+    st.session_state.diario_seq = 0
+if "fila_populada" not in st.session_state:
+    st.session_state.fila_populada = None
+if "unidade_atual" not in st.session_state:
+    st.session_state.unidade_atual = None
+if "linha_fila" not in st.session_state:
+    st.session_state.linha_fila = None
+if "grupos" not in st.session_state:
+    st.session_state.grupos = None
+if "estado" not in st.session_state:
+    st.session_state.estado = None
+if "visao" not in st.session_state:
+    st.session_state.visao = None
+if "visao_criterio" not in st.session_state:
+    st.session_state.visao_criterio = None
+if "indices_filtro" not in st.session_state:
+    st.session_state.indices_filtro = None
+if "fila_revisao" not in st.session_state:
+    st.session_state.fila_revisao = None
+if "fila_revisao_chave" not in st.session_state:
+    st.session_state.fila_revisao_chave = None
+if "ordem_rapida" not in st.session_state:
+    st.session_state.ordem_rapida = None
+if "ordem_rapida_chave" not in st.session_state:
+    st.session_state.ordem_rapida_chave = None
+if "col_url" not in st.session_state:
+    st.session_state.col_url = None
+if "urls" not in st.session_state:
+    st.session_state.urls = None
+if "exportacoes" not in st.session_state:
+    st.session_state.exportacoes = CacheExportacao()
 
 uploaded_file = st.file_uploader("Faça upload do arquivo de imagens (.csv, .xlsx)", type=["csv", "xlsx"])
 
@@ -24,18 +117,8 @@ if uploaded_file is not None:
     
     # Se é um novo arquivo, recarregar
     if st.session_state.uploaded_file_id != file_id:
-        if uploaded_file.name.endswith('.csv'):
-            try:
-                df = pd.read_csv(uploaded_file, sep=None, engine='python', encoding='utf-8')
-            except:
-                uploaded_file.seek(0)
-                try:
-                    df = pd.read_csv(uploaded_file, sep=';', encoding='utf-8')
-                except:
-                    uploaded_file.seek(0)
-                    df = pd.read_csv(uploaded_file, sep=',', encoding='latin-1')
-        else:
-            df = pd.read_excel(uploaded_file)
+        with metricas.etapa("carregamento"):
+            df = ler_planilha(uploaded_file, uploaded_file.name)
 
         st.write("**Colunas detectadas:**", df.columns.tolist())
         st.write(f"**Total de linhas:** {len(df)}")
@@ -44,17 +127,35 @@ if uploaded_file is not None:
         with st.expander("🔍 Ver amostra dos dados"):
             st.dataframe(df.head(3))
         
-        # Adicionar colunas de validação se não existirem
-        for col in ["Valida", "Motivos", "Data_Validacao"]:
-            if col not in df.columns:
-                df[col] = ""
-        
-        # Converter colunas para string para evitar problemas
-        df['Valida'] = df['Valida'].astype(str)
-        df['Motivos'] = df['Motivos'].astype(str)
-        df['Data_Validacao'] = df['Data_Validacao'].astype(str)
+        # Adicionar colunas de validação (como texto) se não existirem
+        df = preparar_colunas(df)
+
+        # Retomar validações já feitas neste mesmo arquivo
+        arquivo_hash = hash_arquivo(uploaded_file.getvalue())
+        gravacao.aguardar()
+        registros, st.session_state.diario_seq = diario.novas_desde(arquivo_hash)
+        restauradas = len(aplicar(df, registros))
+        if restauradas:
+            st.success(f"♻️ {restauradas} validação(ões) restaurada(s) do diário")
 
         st.session_state.df = df
+        st.session_state.arquivo_hash = arquivo_hash
+        st.session_state.unidade_atual = None
+        st.session_state.linha_fila = None
+        with metricas.etapa("deteccao_url"):
+            st.session_state.col_url = detectar_coluna_url(df)
+        st.session_state.grupos = IndiceGrupos(df, st.session_state.col_url, "Categoria" if "Categoria" in df.columns else None)
+        st.session_state.estado = EstadoValidacao(df['Valida'])
+        st.session_state.visao = None
+        st.session_state.visao_criterio = None
+        with metricas.etapa("indices_filtro"):
+            st.session_state.indices_filtro = IndicesFiltro(df)
+        st.session_state.fila_revisao = None
+        st.session_state.fila_revisao_chave = None
+        st.session_state.ordem_rapida = None
+        st.session_state.ordem_rapida_chave = None
+        st.session_state.urls = None
+        st.session_state.exportacoes = CacheExportacao()
         st.session_state.uploaded_file_id = file_id
         st.session_state.indice = 0
 
@@ -62,100 +163,415 @@ if uploaded_file is not None:
 if st.session_state.df is not None:
     df = st.session_state.df
     total = len(df)
-    idx = st.session_state.indice
+    if st.session_state.col_url is None:
+        with metricas.etapa("deteccao_url"):
+            st.session_state.col_url = detectar_coluna_url(df)
+    if st.session_state.grupos is None:
+        st.session_state.grupos = IndiceGrupos(df, st.session_state.col_url, "Categoria" if "Categoria" in df.columns else None)
+    grupos = st.session_state.grupos
+    if st.session_state.estado is None:
+        st.session_state.estado = EstadoValidacao(df['Valida'])
+    estado = st.session_state.estado
+    if st.session_state.indices_filtro is None:
+        st.session_state.indices_filtro = IndicesFiltro(df)
+    indices_filtro = st.session_state.indices_filtro
+
+    def gravar(posicoes, resultado, motivo, data_validacao):
+        # O save já vale na tela; o commit no SQLite fica com a thread do diário
+        gravar_decisao(st.session_state.df, estado, posicoes, resultado, motivo, data_validacao,
+                       gravacao, st.session_state.arquivo_hash)
+
+    def pedir_repeticao(url):
+        """Botão "Tentar de novo": o próximo carregamento da URL ignora o erro guardado."""
+        st.session_state.repetir_imagem = url
 
-    # Função para verificar se está validada
-    def esta_validada(row):
-        val = str(row.get("Valida", "")).strip()
-        return val != "" and val != "nan"
+    def repetir_imagem(url):
+        return st.session_state.pop("repetir_imagem", None) == url
+
+    def sincronizar_equipe():
+        """Aplica as decisões que os outros revisores gravaram no diário."""
+        registros, st.session_state.diario_seq = diario.novas_desde(
+            st.session_state.arquivo_hash, st.session_state.diario_seq
+        )
+        registros = aplicar(df, registros)
+        for resultado, linhas in registros.groupby('Valida'):
+            estado.marcar(linhas['linha'].to_numpy(), resultado)
+
+    def proxima_da_fila(posicao):
+        """Próxima linha pendente reservada para este revisor na fila compartilhada."""
+        arquivo = st.session_state.arquivo_hash
+        if st.session_state.fila_populada != arquivo:
+            fila.popular(arquivo, np.unique(grupos.unidades(np.flatnonzero(~estado.validadas))))
+            st.session_state.fila_populada = arquivo
+
+        atual = st.session_state.unidade_atual
+        if atual is None:
+            inicio = grupos.unidade(posicao) if posicao < total else 0
+        elif posicao == st.session_state.linha_fila:
+            inicio = atual  # mesmo item: só renova o lease
+        else:
+            inicio = atual + 1  # salvou ou pulou: próxima unidade
+
+        while True:
+            unidade = fila.arrendar(arquivo, revisor, inicio=inicio)
+            if unidade is None:
+                st.session_state.unidade_atual = None
+                return total
+            membros = grupos.membros(unidade)
+            pendentes = membros[~estado.validadas[membros]]
+            if len(pendentes):
+                st.session_state.unidade_atual = unidade
+                st.session_state.linha_fila = int(pendentes[0])
+                return int(pendentes[0])
+            # Já validada (por outro revisor ou fora da fila)
+            fila.concluir(arquivo, unidade)
+            inicio = unidade + 1
+
+    def replicar_grupo(posicao, resultado, motivo, data_validacao):
+        """Copia a validação para as duplicatas pendentes da linha. Retorna quantas."""
+        with metricas.etapa("replicacao"):
+            if em_equipe:
+                fila.concluir(st.session_state.arquivo_hash, grupos.unidade(posicao))
+            membros = grupos.membros(posicao)
+            membros = membros[membros != posicao]
+            alvo = membros[~estado.validadas[membros]]
+            if len(alvo):
+                gravar(alvo, resultado, motivo, data_validacao + " (replicado)")
+        return len(alvo)
+
+    def validar_grupo(posicao, resultado, motivo, data_validacao):
+        """Grava a decisão em todas as linhas do grupo de uma vez. Retorna quantas além da exibida."""
+        with metricas.etapa("replicacao"):
+            if em_equipe:
+                fila.concluir(st.session_state.arquivo_hash, grupos.unidade(posicao))
+            membros = grupos.membros(posicao)
+            gravar(membros, resultado, motivo, data_validacao)
+        return len(membros) - 1
 
     # Pular imagens já validadas APENAS se não estamos em navegação manual
     if "navegacao_manual" not in st.session_state:
         st.session_state.navegacao_manual = False
     
+    # Revisão em equipe: fila compartilhada de grupos pendentes
+    with st.expander("👥 Revisão em equipe"):
+        if st.session_state.arquivo_hash:
+            st.checkbox("Usar fila compartilhada com outros revisores", key="modo_equipe")
+            revisor = st.text_input("Seu nome:", key="revisor").strip()
+            concluidas, total_fila, ativos = fila.resumo(st.session_state.arquivo_hash)
+            if total_fila:
+                st.caption(f"{concluidas}/{total_fila} grupos concluídos · {ativos} revisor(es) ativo(s)")
+        else:
+            revisor = ""
+            st.caption("Disponível após o upload de um arquivo.")
+    em_equipe = bool(st.session_state.get("modo_equipe") and st.session_state.arquivo_hash and revisor)
+    if em_equipe:
+        sincronizar_equipe()
+
+    if st.session_state.arquivo_hash:
+        falhas = gravacao.retirar_falhas(st.session_state.arquivo_hash)
+        for (_, posicoes, resultado, motivo, _), erro in falhas:
+            linhas = ", ".join(str(p + 1) for p in posicoes[:10]) + (" ..." if len(posicoes) > 10 else "")
+            st.error(f"⚠️ Falha ao gravar no diário ({erro}): {resultado} {motivo} na(s) linha(s) {linhas}. "
+                     "Gravação repetida; se o aviso voltar, exporte o arquivo para não perder as decisões.")
+        if falhas:
+            # As decisões continuam na tela: grava de novo o estado atual dessas linhas
+            gravacao.regravar(st.session_state.arquivo_hash, df,
+                              np.unique(np.concatenate([posicoes for (_, posicoes, *_), _ in falhas])))
+
+    # Modo de revisão: linha a linha ou um grupo (URL + Categoria) por vez
+    col_modo1, col_modo2, col_modo3 = st.columns([2, 1, 1])
+    with col_modo1:
+        modo_revisao = st.radio("Modo de revisão:", ["Linha a linha", "Por grupo (URL + Categoria)"],
+                                horizontal=True, key="modo_revisao")
+    modo_grupo = modo_revisao != "Linha a linha"
+    with col_modo2:
+        ordem_grupos = st.selectbox("Ordenar grupos por:", [POR_TAMANHO, POR_CATEGORIA],
+                                    key="ordem_grupos", disabled=not modo_grupo)
+    criterio = ordem_grupos if modo_grupo else "linhas"
+    if st.session_state.visao_criterio != criterio:
+        st.session_state.visao = VisaoGrupos(grupos, ordem_grupos, df.get("Categoria")) if modo_grupo else None
+        if st.session_state.visao_criterio is not None:
+            # Trocou o modo ou a ordem: recomeça do primeiro item pendente
+            st.session_state.indice = 0
+            st.session_state.navegacao_manual = False
+        st.session_state.visao_criterio = criterio
+    visao = st.session_state.visao
+
+    # Filtros da fila: combinam os índices montados no upload, sem varrer o DataFrame
+    with st.expander("🔎 Filtrar e ordenar a fila"):
+        col_f1, col_f2, col_f3, col_f4 = st.columns(4)
+        with col_f1:
+            filtro_categorias = st.multiselect(
+                "Categoria:", indices_filtro.valores["Categoria"].distintos() if "Categoria" in indices_filtro.valores else [],
+                key="filtro_categorias", disabled=em_equipe or "Categoria" not in indices_filtro.valores)
+        with col_f2:
+            texto_cnpjs = st.text_input("CNPJ (separe vários por vírgula):", key="filtro_cnpjs",
+                                        disabled=em_equipe or "CNPJ" not in indices_filtro.valores)
+            filtro_cnpjs = [c.strip() for c in texto_cnpjs.split(",") if c.strip()]
+        with col_f3:
+            periodo_disponivel = indices_filtro.periodo_disponivel()
+            filtro_periodo = None
+            if periodo_disponivel is not None:
+                periodo = st.date_input("Período (Data):", value=(), min_value=periodo_disponivel[0],
+                                        max_value=periodo_disponivel[1], format="DD/MM/YYYY",
+                                        key="filtro_periodo", disabled=em_equipe)
+                # Só filtra com início e fim escolhidos
+                if isinstance(periodo, (list, tuple)) and len(periodo) == 2:
+                    filtro_periodo = tuple(periodo)
+            else:
+                st.caption("Sem coluna Data reconhecida para filtrar.")
+        with col_f4:
+            opcoes_ordem = [c for c in COLUNAS_FILTRO + [ORDEM_SUGESTAO] if c in indices_filtro.postos]
+            ordem_fila = st.selectbox("Ordenar fila por:", [ORDEM_PADRAO] + opcoes_ordem,
+                                      key="ordem_fila", disabled=em_equipe)
+        if em_equipe:
+            st.caption("Na fila em equipe a ordem é a da fila compartilhada.")
+    # Sugestões da triagem (triagem.py --caracteristicas): confirmar os casos óbvios de uma vez
+    sugestoes = indices_filtro.sugestoes
+    if sugestoes is not None and len(sugestoes):
+        with st.expander("🤖 Sugestões automáticas da triagem"):
+            confianca_minima = st.slider("Confiança mínima:", min_value=0.5, max_value=1.0, value=0.85, step=0.05,
+                                         key="confianca_minima")
+            st.caption("Só sugestões de NÃO são confirmadas em bloco; SIM pede olho humano no conteúdo e na categoria.")
+            # Prefixo das linhas ordenadas por confiança; só as pendentes entram
+            linhas_sugeridas = sugestoes.acima_de(confianca_minima)
+            linhas_sugeridas = linhas_sugeridas[~estado.validadas[linhas_sugeridas]]
+            valida_sugerida, motivo_sugerido = sugestoes.valores(linhas_sugeridas)
+            confirmaveis = valida_sugerida == 'NÃO'
+            linhas_sugeridas = linhas_sugeridas[confirmaveis]
+            valida_sugerida, motivo_sugerido = valida_sugerida[confirmaveis], motivo_sugerido[confirmaveis]
+            if len(linhas_sugeridas):
+                por_sugestao = pd.DataFrame({"Valida": valida_sugerida, "Motivo": motivo_sugerido}).groupby(
+                    ["Valida", "Motivo"]).indices
+                st.dataframe(
+                    pd.DataFrame([(v, m, len(p)) for (v, m), p in por_sugestao.items()], columns=["Valida", "Motivo", "Linhas"]),
+                    hide_index=True,
+                )
+                if st.button(f"✔ Confirmar {len(linhas_sugeridas)} sugestão(ões)", key="confirmar_sugestoes"):
+                    data_validacao = f"{datetime.now()} (sugestão)"
+                    for (resultado, motivo), parte in por_sugestao.items():
+                        gravar(linhas_sugeridas[parte], resultado, motivo, data_validacao)
+                    st.session_state.navegacao_manual = False
+                    st.rerun()
+            else:
+                st.caption("Nenhuma linha pendente com sugestão acima dessa confiança.")
+
+    chave_fila = (criterio, tuple(filtro_categorias), tuple(filtro_cnpjs), filtro_periodo, ordem_fila)
+    if st.session_state.fila_revisao is None or st.session_state.fila_revisao_chave != chave_fila:
+        with metricas.etapa("fila_filtrada"):
+            linhas_filtro = indices_filtro.filtrar(filtro_categorias, filtro_cnpjs, filtro_periodo)
+            if visao is not None:
+                itens = visao.unidades if linhas_filtro is None else visao.unidades_de(linhas_filtro)
+            else:
+                itens = np.arange(total) if linhas_filtro is None else linhas_filtro
+            st.session_state.fila_revisao = FilaRevisao(
+                indices_filtro.ordenar(itens, ordem_fila), estado, grupos if visao is not None else None,
+                filtrada=linhas_filtro is not None,
+            )
+        if st.session_state.fila_revisao_chave is not None:
+            # Trocou o filtro ou a ordem: recomeça do primeiro item pendente da nova fila
+            st.session_state.indice = 0
+            st.session_state.navegacao_manual = False
+        st.session_state.fila_revisao_chave = chave_fila
+    fila_revisao = st.session_state.fila_revisao
+    fila_revisao.sincronizar(estado)
+    # A fila da sessão é a única que lê o histórico: o que ela já aplicou pode sair
+    estado.descartar_ate(fila_revisao.versao)
+
+    # Modo rápido: atalhos de teclado e fila de pendentes montada uma vez
+    with col_modo3:
+        modo_rapido = st.toggle("⚡ Modo rápido (teclado)", key="modo_rapido", disabled=em_equipe,
+                                help="Indisponível na fila em equipe") and not em_equipe
+    chave_rapida = chave_fila if modo_rapido else None
+    if st.session_state.ordem_rapida_chave != chave_rapida:
+        if not modo_rapido:
+            st.session_state.ordem_rapida = None
+        else:
+            st.session_state.ordem_rapida = OrdemNavegacao(fila_revisao.itens_pendentes())
+        st.session_state.ordem_rapida_chave = chave_rapida
+
+    # `indice` é a posição na ordem de revisão; `idx` é a linha exibida.
+    # Na fila em equipe a ordem é a da fila, então posição e linha coincidem.
+    navegacao = None if em_equipe else fila_revisao
+    pos = st.session_state.indice
+    idx = navegacao.linha(pos) if navegacao is not None else pos
+
     if not st.session_state.navegacao_manual:
-        while idx < total and esta_validada(df.iloc[idx]):
-            idx += 1
+        if em_equipe:
+            idx = pos = proxima_da_fila(idx)
+        else:
+            pos = navegacao.proxima_pendente(pos)
+            idx = navegacao.linha(pos)
     
     # Resetar flag de volta - REMOVIDO para manter estado na interação
     # st.session_state.voltando = False
     
     # Atualizar índice
-    if idx != st.session_state.indice:
-        st.session_state.indice = idx
+    if pos != st.session_state.indice:
+        st.session_state.indice = pos
 
     # Calcular progresso
-    total_validadas = sum(df.apply(esta_validada, axis=1))
-    progresso = total_validadas / total if total > 0 else 0
+    with metricas.etapa("progresso"):
+        total_validadas = estado.total_validadas
+        progresso = total_validadas / total if total > 0 else 0
 
     # Barra de navegação
     col_nav1, col_nav2, col_nav3 = st.columns([1, 2, 1])
     with col_nav1:
         st.metric("Progresso", f"{total_validadas}/{total}")
+        unidade_fila = "grupos" if visao is not None else "linhas"
+        if fila_revisao.filtrada:
+            st.caption(f"🔎 Fila filtrada: {fila_revisao.total_concluidos}/{len(fila_revisao)} {unidade_fila} concluídos")
+        elif visao is not None:
+            st.caption(f"{fila_revisao.total_concluidos}/{len(fila_revisao)} grupos concluídos")
     with col_nav2:
         st.progress(progresso)
     with col_nav3:
-        linha_saltar = st.number_input(
-            "Ir para linha:",
-            min_value=1,
-            max_value=total,
-            value=idx + 1,
-            key=f"nav_input_{idx}"
-        )
-        if st.button("Ir", key=f"btn_ir_{idx}"):
-            st.session_state.indice = linha_saltar - 1
-            st.session_state.navegacao_manual = True
-            st.rerun()
+        # Fragmento: digitar a linha não reexecuta a página; só o "Ir" navega
+        @st.fragment
+        def ir_para_linha():
+            linha_saltar = st.number_input(
+                "Ir para linha:",
+                min_value=1,
+                max_value=total,
+                value=min(idx + 1, total),
+                key=f"nav_input_{idx}"
+            )
+            if st.button("Ir", key=f"btn_ir_{idx}"):
+                destino = navegacao.posicao(linha_saltar - 1) if navegacao is not None else linha_saltar - 1
+                if destino is None:
+                    st.warning(f"A linha {linha_saltar} está fora da fila filtrada.")
+                else:
+                    st.session_state.indice = destino
+                    st.session_state.navegacao_manual = True
+                    st.rerun()
+
+        ir_para_linha()
 
     st.divider()
 
-    # Downloads
-    st.markdown("### 📥 Opções de Download")
-    col_down1, col_down2 = st.columns(2)
-    with col_down1:
-        csv_completa = df.to_csv(index=False, sep=";", encoding='utf-8-sig')
-        st.download_button(
-            label="📥 Base COMPLETA",
-            data=csv_completa,
-            file_name=f"validacao_{datetime.now().strftime('%d_%m_%Y_%H%M%S')}.csv",
-            mime="text/csv",
-            key=f"down_completa_{idx}"
-        )
-    with col_down2:
-        df_validados = df[df.apply(esta_validada, axis=1)].copy()
-        csv_validados = df_validados.to_csv(index=False, sep=";", encoding='utf-8-sig')
-        st.download_button(
-            label="✅ Apenas VALIDADAS",
-            data=csv_validados,
-            file_name=f"validadas_{datetime.now().strftime('%d_%m_%Y_%H%M%S')}.csv",
-            mime="text/csv",
-            key=f"down_validadas_{idx}"
-        )
+    # Downloads (fragmento: trocar o formato não reexecuta a página)
+    @st.fragment
+    def painel_downloads():
+        st.markdown("### 📥 Opções de Download")
+        formato_download = st.radio("Formato:", list(FORMATOS), horizontal=True, key="formato_download")
+        extensao, mime = FORMATOS[formato_download]
+        exportacoes = st.session_state.exportacoes
+        col_down1, col_down2 = st.columns(2)
+        with col_down1:
+            # Arquivo gerado só no clique (e reaproveitado enquanto não houver novo save)
+            st.download_button(
+                label="📥 Base COMPLETA",
+                data=exportacoes.gerador("completa", lambda: estado.versao, formato_download, lambda: df),
+                file_name=f"validacao_{datetime.now().strftime('%d_%m_%Y_%H%M%S')}.{extensao}",
+                mime=mime,
+                on_click="ignore",
+                key=f"down_completa_{idx}"
+            )
+        with col_down2:
+            st.download_button(
+                label="✅ Apenas VALIDADAS",
+                data=exportacoes.gerador("validadas", lambda: estado.versao, formato_download, lambda: df[estado.validadas]),
+                file_name=f"validadas_{datetime.now().strftime('%d_%m_%Y_%H%M%S')}.{extensao}",
+                mime=mime,
+                on_click="ignore",
+                key=f"down_validadas_{idx}"
+            )
+
+    painel_downloads()
     st.divider()
 
-    if idx < total:
+    def concluido(item):
+        """Item da fila rápida (linha ou grupo) sem nenhuma linha pendente."""
+        if visao is not None:
+            return bool(estado.validadas[grupos.membros(item)].all())
+        return bool(estado.esta_validada(item))
+
+    def decidir_rapido(linha, resultado, motivo):
+        """Save otimista do modo rápido: vale na hora; o diário grava em segundo plano."""
+        data_validacao = str(datetime.now())
+        if visao is not None:
+            validar_grupo(linha, resultado, motivo, data_validacao)
+        else:
+            gravar(linha, resultado, motivo, data_validacao)
+            replicar_grupo(linha, resultado, motivo, data_validacao)
+        st.session_state.ordem_rapida.avancar(concluido)
+
+    # Fragmento: cada decisão redesenha só este painel, com a próxima imagem já pré-buscada
+    @st.fragment
+    def painel_rapido():
+        inicio_painel = time.perf_counter()
+        ordem = st.session_state.ordem_rapida
+        # Sem pular concluídos aqui: depois do Voltar, o item já decidido aparece com o veredito atual
+        linha = ordem.atual()
+        st.caption(f"⚡ {min(ordem.cursor + 1, len(ordem))}/{len(ordem)} na fila rápida · "
+                   f"{estado.total_validadas}/{total} linhas validadas")
+        if linha is None:
+            st.success("🎉 Fila rápida concluída! Desligue o modo rápido para ver o resumo.")
+            return
+
+        col_url = st.session_state.col_url
+        url_imagem = normalizar_url(df[col_url].iat[linha]) if col_url else ""
+        if url_imagem:
+            with metricas.etapa("imagem_tela"):
+                img, erro_imagem = prebusca.obter(url_imagem, repetir_falha=repetir_imagem(url_imagem))
+        else:
+            img, erro_imagem = None, "URL vazia ou inválida"
+        if col_url:
+            for proxima in ordem.proximas(PREBUSCA_QTD):
+                url_proxima = normalizar_url(df[col_url].iat[proxima])
+                if url_proxima:
+                    prebusca.agendar(url_proxima)
+
+        col_img, col_dados = st.columns([2, 1])
+        with col_img:
+            if img is not None:
+                st.image(img)
+            else:
+                st.error(f"❌ {erro_imagem}")
+                if url_imagem:
+                    st.button("🔄 Tentar de novo", key="rapido_repetir", on_click=pedir_repeticao, args=(url_imagem,))
+        with col_dados:
+            st.markdown(f"**Linha {linha + 1} de {total}**")
+            for col in ("Categoria", "Data", "CNPJ"):
+                if col in df.columns:
+                    valor = df[col].iat[linha]
+                    st.write(f"**{col}:** {formatar_data(valor) if pd.notna(valor) else 'N/A'}")
+            sugestao = sugestoes.sugestao(linha) if sugestoes is not None else None
+            if sugestao is not None and sugestao[0] == REVISAR:
+                st.caption("🤖 Triagem: imagem pequena ou desfocada, olhe com atenção")
+            elif sugestao is not None:
+                st.caption(f"🤖 Sugestão: {sugestao[0]} {sugestao[1]} ({sugestao[2]:.0%})")
+            membros = grupos.membros(linha)
+            if len(membros) > 1:
+                st.info(f"🔄 {len(membros)} linha(s) com mesma URL + Categoria")
+            if estado.esta_validada(linha):
+                st.warning(f"Já validada como: **{df['Valida'].iat[linha]}** {df['Motivos'].iat[linha]}")
+
+        # Atalhos: V = válida, S = sem imagem, 1-5 = motivos, ←/→ = voltar/pular
+        # Sem imagem carregada, só SEM IMAGEM (ou pular) vale, como no modo normal
+        sem_imagem = img is None
+        col_a1, col_a2, col_a3, col_a4 = st.columns(4)
+        col_a1.button("✔ Válida", key="rapido_valida", shortcut="V", type="primary", use_container_width=True,
+                      disabled=sem_imagem, on_click=decidir_rapido, args=(linha, 'SIM', ''))
+        col_a2.button("SEM IMAGEM", key="rapido_sem_imagem", shortcut="S", use_container_width=True,
+                      on_click=decidir_rapido, args=(linha, 'NÃO', 'SEM IMAGEM'))
+        col_a3.button("← Voltar", key="rapido_voltar", shortcut="Left", use_container_width=True,
+                      on_click=ordem.voltar)
+        col_a4.button("→ Pular", key="rapido_pular", shortcut="Right", use_container_width=True,
+                      on_click=ordem.avancar, args=(concluido,))
+        for coluna, (numero, motivo) in zip(st.columns(len(MOTIVOS_OPCOES)), enumerate(MOTIVOS_OPCOES, start=1)):
+            coluna.button(f"✗ {motivo}", key=f"rapido_motivo_{numero}", shortcut=str(numero), use_container_width=True,
+                          disabled=sem_imagem, on_click=decidir_rapido, args=(linha, 'NÃO', motivo))
+        metricas.registrar("painel_rapido", (time.perf_counter() - inicio_painel) * 1000)
+
+    if modo_rapido:
+        painel_rapido()
+    elif idx < total:
         linha = df.iloc[idx]
         
         # Detectar coluna de URL
-        col_url = None
-        possiveis_urls = ['URL_Imagem', 'url_imagem', 'URL', 'url', 'link', 'Link', 'image_url', 'imagem']
-        for col in possiveis_urls:
-            if col in df.columns:
-                col_url = col
-                break
-        
-        if not col_url:
-            for col in df.columns:
-                if 'url' in col.lower() or 'link' in col.lower():
-                    col_url = col
-                    break
-        
-        if not col_url:
-            for col in df.columns:
-                amostra = str(df[col].iloc[0]) if len(df) > 0 else ""
-                if amostra.startswith('http://') or amostra.startswith('https://'):
-                    col_url = col
-                    break
+        col_url = st.session_state.col_url
         
         col_categoria = "Categoria" if "Categoria" in df.columns else None
         col_data = "Data" if "Data" in df.columns else None
@@ -173,68 +589,69 @@ if st.session_state.df is not None:
             st.error(f"❌ Nenhuma coluna de URL encontrada. Colunas disponíveis: {df.columns.tolist()}")
         
         if col_url and pd.notna(linha[col_url]):
-            url_imagem = str(linha[col_url]).strip()
+            url_imagem = normalizar_url(linha[col_url])
             
-            if url_imagem and url_imagem.lower() != "nan" and url_imagem != "":
-                if not (url_imagem.startswith("http://") or url_imagem.startswith("https://")):
-                    url_imagem = "https://" + url_imagem
-                
-                try:
-                    headers = {
-                        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                        'Accept': 'image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8',
-                    }
-                    
-                    response = requests.get(url_imagem, timeout=30, allow_redirects=True, headers=headers, verify=True)
-                    response.raise_for_status()
-                    
-                    content_type = response.headers.get('content-type', '')
-                    if 'image' not in content_type.lower() and len(response.content) < 100:
-                        erro_imagem = f"URL não retorna imagem válida (tipo: {content_type})"
-                    else:
-                        img = Image.open(BytesIO(response.content))
-                        if img.mode in ('RGBA', 'LA', 'P'):
-                            img = img.convert('RGB')
-                        tem_imagem = True
-                        
-                except requests.exceptions.Timeout:
-                    erro_imagem = "⏱️ Timeout: Servidor demorou muito para responder"
-                except requests.exceptions.ConnectionError:
-                    erro_imagem = "🔌 Erro de conexão: Não foi possível conectar ao servidor"
-                except requests.exceptions.HTTPError as e:
-                    erro_imagem = f"❌ HTTP {e.response.status_code}: {e.response.reason}"
-                except Exception as e:
-                    erro_imagem = f"⚠️ Erro: {str(e)[:100]}"
+            if url_imagem:
+                with metricas.etapa("imagem_tela"):
+                    img, erro_imagem = prebusca.obter(url_imagem, repetir_falha=repetir_imagem(url_imagem))
+                tem_imagem = img is not None
             else:
                 erro_imagem = "URL vazia ou inválida"
         else:
             erro_imagem = "Sem URL"
 
+        # Pré-busca das próximas imagens pendentes em segundo plano
+        if col_url:
+            agendadas = 0
+            j = pos + 1
+            fim = len(navegacao) if navegacao is not None else total
+            while j < fim and agendadas < PREBUSCA_QTD:
+                linha_j = navegacao.linha(j) if navegacao is not None else j
+                if not estado.esta_validada(linha_j):
+                    url_proxima = normalizar_url(df[col_url].iat[linha_j])
+                    if url_proxima:
+                        prebusca.agendar(url_proxima)
+                        agendadas += 1
+                j += 1
+
         # Layout
         col1, col2, col3 = st.columns([2, 1, 1])
         with col1:
-            st.markdown(f"## Imagem {idx+1} de {total}")
-            if tem_imagem and img:
-                try:
-                    largura = 360
-                    altura = int(largura * 16 / 9)
-                    img_resized = img.resize((largura, altura), Image.Resampling.LANCZOS)
-                    st.image(img_resized, use_container_width=False)
-                except Exception as e:
-                    st.error(f"Erro ao processar imagem: {str(e)}")
-                    st.code(f"URL: {url_imagem}", language=None)
-            elif erro_imagem:
-                st.error(f"❌ {erro_imagem}")
-                if url_imagem:
-                    st.code(f"URL: {url_imagem}", language=None)
-                    st.markdown(f"[🔗 Testar URL no navegador]({url_imagem})")
+            if visao is not None and navegacao is not None:
+                st.markdown(f"## Grupo {pos+1} de {len(navegacao)}")
+                st.caption(f"Linha {idx+1} de {total} · {len(grupos.membros(idx))} linha(s) no grupo")
             else:
-                st.warning("⚠️ Sem imagem disponível")
-        
+                st.markdown(f"## Imagem {idx+1} de {total}")
+                if navegacao is not None and navegacao.filtrada:
+                    st.caption(f"{pos+1}ª de {len(navegacao)} na fila filtrada")
+            # Fragmento: o zoom não reexecuta a página
+            @st.fragment
+            def mostrar_imagem():
+                if tem_imagem and img:
+                    try:
+                        # Resolução original só quando o revisor pede (vem do cache em disco)
+                        if st.toggle("🔍 Ampliar (resolução original)", key=f"zoom_{idx}"):
+                            original, _ = baixar_conteudo(url_imagem, prebusca.cache)
+                            st.image(original if original is not None else img, use_container_width=True)
+                        else:
+                            st.image(img, use_container_width=False)
+                    except Exception as e:
+                        st.error(f"Erro ao processar imagem: {str(e)}")
+                        st.code(f"URL: {url_imagem}", language=None)
+                elif erro_imagem:
+                    st.error(f"❌ {erro_imagem}")
+                    if url_imagem:
+                        st.code(f"URL: {url_imagem}", language=None)
+                        st.markdown(f"[🔗 Testar URL no navegador]({url_imagem})")
+                else:
+                    st.warning("⚠️ Sem imagem disponível")
+
+            mostrar_imagem()
+
         with col2:
             st.markdown("### Informações Item Anterior")
-            if idx > 0:
-                linha_ant = df.iloc[idx - 1]
+            if pos > 0:
+                linha_ant = df.iloc[navegacao.linha(pos - 1) if navegacao is not None else idx - 1]
                 
                 if col_url:
                     url_val_ant = str(linha_ant[col_url]) if pd.notna(linha_ant[col_url]) else "N/A"
@@ -243,7 +660,7 @@ if st.session_state.df is not None:
                     cat_ant = str(linha_ant[col_categoria]) if pd.notna(linha_ant[col_categoria]) else "N/A"
                     st.text_input("**Categoria (Ant):**", cat_ant, disabled=True, key=f"cat_ant_{idx}")
                 if col_data:
-                    data_ant = str(linha_ant[col_data]) if pd.notna(linha_ant[col_data]) else "N/A"
+                    data_ant = formatar_data(linha_ant[col_data]) if pd.notna(linha_ant[col_data]) else "N/A"
                     st.text_input("**Data (Ant):**", data_ant, disabled=True, key=f"data_ant_{idx}")
                 if col_cnpj:
                     cnpj_ant = str(linha_ant[col_cnpj]) if pd.notna(linha_ant[col_cnpj]) else "N/A"
@@ -264,218 +681,255 @@ if st.session_state.df is not None:
                 cat = str(linha[col_categoria]) if pd.notna(linha[col_categoria]) else "N/A"
                 st.text_input("**Categoria:**", cat, disabled=True, key=f"cat_{idx}")
             if col_data:
-                data = str(linha[col_data]) if pd.notna(linha[col_data]) else "N/A"
+                data = formatar_data(linha[col_data]) if pd.notna(linha[col_data]) else "N/A"
                 st.text_input("**Data:**", data, disabled=True, key=f"data_{idx}")
             if col_cnpj:
                 cnpj = str(linha[col_cnpj]) if pd.notna(linha[col_cnpj]) else "N/A"
                 st.text_input("**CNPJ:**", cnpj, disabled=True, key=f"cnpj_{idx}")
             
-            # Mostrar quantas duplicatas existem
-            if col_url and col_categoria and pd.notna(linha[col_url]) and pd.notna(linha[col_categoria]):
-                url_atual = str(linha[col_url]).strip()
-                cat_atual = str(linha[col_categoria]).strip()
-                
-                # Contar duplicatas (mesma URL + Categoria)
-                duplicatas_totais = 0
-                duplicatas_pendentes = 0
-                for i in range(len(df)):
-                    row = df.iloc[i]
-                    url_row = str(row[col_url]).strip() if pd.notna(row[col_url]) else None
-                    cat_row = str(row[col_categoria]).strip() if pd.notna(row[col_categoria]) else None
-                    
-                    if url_row == url_atual and cat_row == cat_atual:
-                        duplicatas_totais += 1
-                        if str(row['Valida']).strip() == "":
-                            duplicatas_pendentes += 1
-                
-                if duplicatas_totais > 1:
-                    st.info(f"🔄 **{duplicatas_totais} linha(s) com mesma URL + Categoria**\n\n{duplicatas_pendentes} ainda não validadas")
+            sugestao = sugestoes.sugestao(idx) if sugestoes is not None else None
+            if sugestao is not None and sugestao[0] == REVISAR:
+                st.info("🤖 **Triagem:** imagem pequena ou desfocada, olhe com atenção antes de decidir")
+            elif sugestao is not None:
+                st.info(f"🤖 **Sugestão da triagem:** {sugestao[0]} {sugestao[1]} ({sugestao[2]:.0%} de confiança)")
+
+            # Mostrar quantas duplicatas existem (mesma URL + Categoria)
+            duplicatas = grupos.membros(idx)
+            duplicatas_totais = len(duplicatas)
+            if duplicatas_totais > 1:
+                duplicatas_pendentes = int((~estado.validadas[duplicatas]).sum())
+                st.info(f"🔄 **{duplicatas_totais} linha(s) com mesma URL + Categoria**\n\n{duplicatas_pendentes} ainda não validadas")
 
-        st.divider()
-        st.markdown("### Validação")
+            # Imagens parecidas (hash perceptual) em outras lojas ou datas
+            if tem_imagem:
+                semelhantes = dict(indice_hashes.vizinhos(url_imagem))
+                semelhantes[url_imagem] = 0
+                if st.session_state.urls is None:
+                    st.session_state.urls = IndiceValores(df[col_url].map(normalizar_url))
+                urls = st.session_state.urls
+                # Só as linhas das URLs parecidas, sem varrer o DataFrame
+                posicoes_suspeitas = urls.posicoes(list(semelhantes))
+                posicoes_suspeitas = posicoes_suspeitas[posicoes_suspeitas != idx]
+                if col_cnpj or col_data:
+                    outra_origem = np.zeros(len(posicoes_suspeitas), dtype=bool)
+                    if col_cnpj:
+                        outra_origem |= df[col_cnpj].iloc[posicoes_suspeitas].to_numpy() != linha[col_cnpj]
+                    if col_data:
+                        outra_origem |= df[col_data].iloc[posicoes_suspeitas].to_numpy() != linha[col_data]
+                    posicoes_suspeitas = posicoes_suspeitas[outra_origem]
+                if len(posicoes_suspeitas):
+                    st.warning(f"🖼️ **{len(posicoes_suspeitas)} linha(s) com imagem igual ou parecida** em outro CNPJ/data — verifique MESMA IMAGEM ou FRAUDE")
+                    with st.expander("Ver imagens parecidas"):
+                        tabela = df.iloc[posicoes_suspeitas[:50]].copy()
+                        tabela.insert(0, "Linha", posicoes_suspeitas[:50] + 1)
+                        tabela.insert(1, "Distância", [semelhantes[u] for u in urls.valores(posicoes_suspeitas[:50])])
+                        st.dataframe(tabela.sort_values("Distância"), hide_index=True)
+
+        # Fragmento: escolher Válida/Inválida ou o motivo só redesenha este painel;
+        # salvar, voltar e pular reexecutam a página inteira (st.rerun).
+        @st.fragment
+        def painel_validacao():
+            inicio_painel = time.perf_counter()
+            st.divider()
+            st.markdown("### Validação")
         
-        # Debug info
-        with st.expander("🐛 Debug Info"):
-            st.write(f"Índice atual: {idx}")
-            st.write(f"Valida atual: '{df.iloc[idx]['Valida']}'")
-            st.write(f"Total validadas: {total_validadas}")
-            st.write(f"Navegação Manual: {st.session_state.navegacao_manual}")
+            # Debug info
+            with st.expander("🐛 Debug Info"):
+                st.write(f"Índice atual: {idx}")
+                st.write(f"Posição na ordem de revisão: {pos}")
+                st.write(f"Valida atual: '{df.iloc[idx]['Valida']}'")
+                st.write(f"Total validadas: {total_validadas}")
+                st.write(f"Navegação Manual: {st.session_state.navegacao_manual}")
+                tempo_rerun = st.session_state.get("tempo_rerun_ms")
+                if tempo_rerun is not None:
+                    st.write(f"Último rerun completo: {tempo_rerun:.0f} ms (orçamento: {ORCAMENTO_RERUN_MS} ms)")
+                    if tempo_rerun > ORCAMENTO_RERUN_MS:
+                        st.warning("⏱️ Rerun acima do orçamento")
+                tempo_painel = st.session_state.get("tempo_painel_ms")
+                if tempo_painel is not None:
+                    st.write(f"Último rerun do painel de validação: {tempo_painel:.0f} ms")
+
+                # Tempos por etapa (liga para todas as sessões deste servidor). Só o clique
+                # muda a chave global; os reruns das outras sessões não a desfazem.
+                def alternar_metricas():
+                    metricas.ativo = st.session_state.medir_etapas
+
+                st.checkbox("⏱️ Medir tempos por etapa", value=metricas.ativo, key="medir_etapas",
+                            on_change=alternar_metricas)
+                if metricas.ativo:
+                    resumo_etapas = metricas.resumo()
+                    if len(resumo_etapas):
+                        st.dataframe(resumo_etapas, hide_index=True)
+                        st.download_button(
+                            "📊 Métricas (formato Prometheus)",
+                            data=metricas.texto_prometheus,
+                            file_name="metricas_validador.prom",
+                            mime="text/plain",
+                            on_click="ignore",
+                            key=f"down_metricas_{idx}"
+                        )
+                    else:
+                        st.caption("Nenhuma medição ainda.")
         
-        # Mostrar status da linha atual
-        linha_ja_validada = esta_validada(linha)
-        if linha_ja_validada:
-            valida_anterior = df.iloc[idx]['Valida']
-            motivo_anterior = df.iloc[idx]['Motivos']
-            mensagem_motivo = f" - {motivo_anterior}" if motivo_anterior else ""
-            st.warning(f"⚠️ Esta linha já foi validada anteriormente como: **{valida_anterior}**{mensagem_motivo}")
-            st.info("💡 Você pode revisar e salvar novamente para alterar a validação.")
+            # Mostrar status da linha atual
+            linha_ja_validada = estado.esta_validada(idx)
+            if linha_ja_validada:
+                valida_anterior = df.iloc[idx]['Valida']
+                motivo_anterior = df.iloc[idx]['Motivos']
+                mensagem_motivo = f" - {motivo_anterior}" if motivo_anterior else ""
+                st.warning(f"⚠️ Esta linha já foi validada anteriormente como: **{valida_anterior}**{mensagem_motivo}")
+                st.info("💡 Você pode revisar e salvar novamente para alterar a validação.")
         
-        if not tem_imagem:
-            st.warning("⚠️ Imagem não carregou - será marcada como **SEM IMAGEM**")
+            if not tem_imagem:
+                st.warning("⚠️ Imagem não carregou - será marcada como **SEM IMAGEM**")
+                if url_imagem:
+                    # Timeout/5xx fica alguns minutos no cache: o revisor pode pedir outra tentativa
+                    st.button("🔄 Tentar de novo", key=f"btn_repetir_{idx}", on_click=pedir_repeticao, args=(url_imagem,))
             
-            col_btn1, col_btn2, col_btn3 = st.columns(3)
-            with col_btn1:
-                if st.button('✔ Salvar SEM IMAGEM', use_container_width=True, key=f"btn_sem_{idx}", type="primary"):
-                    data_validacao = str(datetime.now())
-                    
-                    # Salvar linha atual
-                    st.session_state.df.loc[idx, 'Valida'] = 'NÃO'
-                    st.session_state.df.loc[idx, 'Motivos'] = 'SEM IMAGEM'
-                    st.session_state.df.loc[idx, 'Data_Validacao'] = data_validacao
-                    
-                    # REPLICAÇÃO AUTOMÁTICA para SEM IMAGEM
-                    url_atual = str(linha[col_url]).strip() if col_url and pd.notna(linha[col_url]) else None
-                    categoria_atual = str(linha[col_categoria]).strip() if col_categoria and pd.notna(linha[col_categoria]) else None
+                col_btn1, col_btn2, col_btn3 = st.columns(3)
+                with col_btn1:
+                    if st.button('✔ Salvar SEM IMAGEM', use_container_width=True, key=f"btn_sem_{idx}", type="primary"):
+                        data_validacao = str(datetime.now())
                     
-                    linhas_replicadas = 0
-                    if url_atual and categoria_atual:
-                        for i in range(len(st.session_state.df)):
-                            if i != idx:
-                                row = st.session_state.df.iloc[i]
-                                url_row = str(row[col_url]).strip() if col_url and pd.notna(row[col_url]) else None
-                                cat_row = str(row[col_categoria]).strip() if col_categoria and pd.notna(row[col_categoria]) else None
-                                valida_row = str(row['Valida']).strip()
-                                
-                                if url_row == url_atual and cat_row == categoria_atual and valida_row in ["", "nan"]:
-                                    st.session_state.df.loc[i, 'Valida'] = 'NÃO'
-                                    st.session_state.df.loc[i, 'Motivos'] = 'SEM IMAGEM'
-                                    st.session_state.df.loc[i, 'Data_Validacao'] = data_validacao + " (replicado)"
-                                    linhas_replicadas += 1
+                        if visao is not None:
+                            # Uma decisão para o grupo todo
+                            linhas_replicadas = validar_grupo(idx, 'NÃO', 'SEM IMAGEM', data_validacao)
+                        else:
+                            # Salvar linha atual
+                            gravar(idx, 'NÃO', 'SEM IMAGEM', data_validacao)
+
+                            # REPLICAÇÃO AUTOMÁTICA para SEM IMAGEM
+                            linhas_replicadas = replicar_grupo(idx, 'NÃO', 'SEM IMAGEM', data_validacao)
                     
-                    st.session_state.indice = idx + 1
-                    st.session_state.navegacao_manual = False
+                        st.session_state.indice = pos + 1
+                        st.session_state.navegacao_manual = False
                     
-                    if linhas_replicadas > 0:
-                        st.success(f"✅ Salvo como SEM IMAGEM!\n\n🔄 **{linhas_replicadas} linha(s) duplicada(s) replicada(s) automaticamente!**")
-                    else:
-                        st.success("✅ Salvo como SEM IMAGEM!")
+                        if linhas_replicadas > 0:
+                            st.success(f"✅ Salvo como SEM IMAGEM!\n\n🔄 **{linhas_replicadas} linha(s) duplicada(s) replicada(s) automaticamente!**")
+                        else:
+                            st.success("✅ Salvo como SEM IMAGEM!")
                     
-                    st.rerun()
-            with col_btn2:
-                if st.button('← Voltar', use_container_width=True, key=f"btn_v_sem_{idx}"):
-                    # Voltar para a linha anterior
-                    if idx > 0:
-                        st.session_state.indice = idx - 1
-                        st.session_state.navegacao_manual = True
                         st.rerun()
-            with col_btn3:
-                if st.button('→ Pular', use_container_width=True, key=f"btn_p_sem_{idx}"):
-                    st.session_state.indice = idx + 1
-                    st.session_state.navegacao_manual = False
-                    st.rerun()
-        else:
-            # Radio buttons - armazenar seleção no session_state para evitar rerun
-            radio_key = f"radio_{idx}"
-            
-            # Verificar se já foi validada antes para pré-selecionar
-            if linha_ja_validada:
-                valida_anterior = df.iloc[idx]['Valida']
-                default_valido = 'Válida ✔' if valida_anterior == 'SIM' else 'Inválida ✗'
+                with col_btn2:
+                    if st.button('← Voltar', use_container_width=True, key=f"btn_v_sem_{idx}"):
+                        # Voltar para a linha anterior
+                        if pos > 0:
+                            st.session_state.indice = pos - 1
+                            st.session_state.navegacao_manual = True
+                            st.rerun()
+                with col_btn3:
+                    if st.button('→ Pular', use_container_width=True, key=f"btn_p_sem_{idx}"):
+                        st.session_state.indice = pos + 1
+                        st.session_state.navegacao_manual = False
+                        st.rerun()
             else:
-                default_valido = 'Válida ✔'
+                # Radio buttons - armazenar seleção no session_state para evitar rerun
+                radio_key = f"radio_{idx}"
             
-            valido = st.radio('Como deseja classificar esta imagem?', 
-                            ['Válida ✔', 'Inválida ✗'], 
-                            key=radio_key,
-                            index=0 if default_valido == 'Válida ✔' else 1)
+                # Verificar se já foi validada antes para pré-selecionar
+                if linha_ja_validada:
+                    valida_anterior = df.iloc[idx]['Valida']
+                    default_valido = 'Válida ✔' if valida_anterior == 'SIM' else 'Inválida ✗'
+                else:
+                    default_valido = 'Válida ✔'
             
-            motivo_selecionado = ""
-            motivo_key = f"mot_{idx}"
+                valido = st.radio('Como deseja classificar esta imagem?', 
+                                ['Válida ✔', 'Inválida ✗'], 
+                                key=radio_key,
+                                index=0 if default_valido == 'Válida ✔' else 1)
             
-            if valido == 'Inválida ✗':
-                st.markdown("**Selecione o motivo da invalidação:**")
-                motivos_opcoes = ['FRAUDE', 'MESMA IMAGEM', 'NÃO É PONTO EXTRA', 'OUTRA CATEGORIA', 'OUTRO PRODUTO']
+                motivo_selecionado = ""
+                motivo_key = f"mot_{idx}"
+            
+                if valido == 'Inválida ✗':
+                    st.markdown("**Selecione o motivo da invalidação:**")
                 
-                # Pré-selecionar motivo anterior se existir
-                index_anterior = 0
-                if linha_ja_validada:
-                    motivo_anterior = str(df.iloc[idx]['Motivos'])
-                    if motivo_anterior in motivos_opcoes:
-                        index_anterior = motivos_opcoes.index(motivo_anterior)
+                    # Pré-selecionar motivo anterior se existir
+                    index_anterior = 0
+                    if linha_ja_validada:
+                        motivo_anterior = str(df.iloc[idx]['Motivos'])
+                        if motivo_anterior in MOTIVOS_OPCOES:
+                            index_anterior = MOTIVOS_OPCOES.index(motivo_anterior)
+                    elif sugestao is not None and sugestao[1] in MOTIVOS_OPCOES:
+                        # O revisor escolheu invalidar: o motivo sugerido pela triagem vem primeiro
+                        index_anterior = MOTIVOS_OPCOES.index(sugestao[1])
                 
-                motivo_selecionado = st.radio(
-                    'Motivo:',
-                    motivos_opcoes,
-                    key=motivo_key,
-                    label_visibility="collapsed",
-                    index=index_anterior
-                )
+                    motivo_selecionado = st.radio(
+                        'Motivo:',
+                        MOTIVOS_OPCOES,
+                        key=motivo_key,
+                        label_visibility="collapsed",
+                        index=index_anterior
+                    )
             
-            # Botões de ação
-            col_btn1, col_btn2, col_btn3 = st.columns(3)
-            with col_btn1:
-                if st.button('✔ Salvar e Avançar', use_container_width=True, key=f"btn_s_{idx}", type="primary"):
-                    # Salvar no DataFrame
-                    resultado = 'SIM' if valido == 'Válida ✔' else 'NÃO'
-                    data_validacao = str(datetime.now())
+                # Botões de ação
+                col_btn1, col_btn2, col_btn3 = st.columns(3)
+                with col_btn1:
+                    if st.button('✔ Salvar e Avançar', use_container_width=True, key=f"btn_s_{idx}", type="primary"):
+                        # Salvar no DataFrame
+                        resultado = 'SIM' if valido == 'Válida ✔' else 'NÃO'
+                        data_validacao = str(datetime.now())
                     
-                    # Salvar linha atual
-                    st.session_state.df.loc[idx, 'Valida'] = resultado
-                    st.session_state.df.loc[idx, 'Motivos'] = motivo_selecionado
-                    st.session_state.df.loc[idx, 'Data_Validacao'] = data_validacao
-                    
-                    # REPLICAÇÃO AUTOMÁTICA: Buscar linhas duplicadas (mesma URL + Categoria)
-                    url_atual = str(linha[col_url]).strip() if col_url and pd.notna(linha[col_url]) else None
-                    categoria_atual = str(linha[col_categoria]).strip() if col_categoria and pd.notna(linha[col_categoria]) else None
-                    
-                    linhas_replicadas = 0
-                    if url_atual and categoria_atual:
-                        # Encontrar todas as linhas com mesma URL e Categoria que ainda não foram validadas
-                        for i in range(len(st.session_state.df)):
-                            if i != idx:  # Não replicar na própria linha
-                                row = st.session_state.df.iloc[i]
-                                url_row = str(row[col_url]).strip() if col_url and pd.notna(row[col_url]) else None
-                                cat_row = str(row[col_categoria]).strip() if col_categoria and pd.notna(row[col_categoria]) else None
-                                valida_row = str(row['Valida']).strip()
-                                
-                                # Se URL e Categoria são iguais e ainda não foi validada
-                                if url_row == url_atual and cat_row == categoria_atual and valida_row in ["", "nan"]:
-                                    st.session_state.df.loc[i, 'Valida'] = resultado
-                                    st.session_state.df.loc[i, 'Motivos'] = motivo_selecionado
-                                    st.session_state.df.loc[i, 'Data_Validacao'] = data_validacao + " (replicado)"
-                                    linhas_replicadas += 1
+                        if visao is not None:
+                            # Uma decisão para o grupo todo
+                            linhas_replicadas = validar_grupo(idx, resultado, motivo_selecionado, data_validacao)
+                        else:
+                            # Salvar linha atual
+                            gravar(idx, resultado, motivo_selecionado, data_validacao)
+
+                            # REPLICAÇÃO AUTOMÁTICA: linhas duplicadas (mesma URL + Categoria) ainda não validadas
+                            linhas_replicadas = replicar_grupo(idx, resultado, motivo_selecionado, data_validacao)
                     
-                    # Limpar session_state dos radio buttons (se existirem)
-                    radio_key_atual = f"radio_{idx}"
-                    motivo_key_atual = f"mot_{idx}"
+                        # Limpar session_state dos radio buttons (se existirem)
+                        radio_key_atual = f"radio_{idx}"
+                        motivo_key_atual = f"mot_{idx}"
                     
-                    if radio_key_atual in st.session_state:
-                        del st.session_state[radio_key_atual]
-                    if motivo_key_atual in st.session_state:
-                        del st.session_state[motivo_key_atual]
+                        if radio_key_atual in st.session_state:
+                            del st.session_state[radio_key_atual]
+                        if motivo_key_atual in st.session_state:
+                            del st.session_state[motivo_key_atual]
                     
-                    # Avançar
-                    st.session_state.indice = idx + 1
-                    st.session_state.navegacao_manual = False
+                        # Avançar
+                        st.session_state.indice = pos + 1
+                        st.session_state.navegacao_manual = False
                     
-                    # Feedback com informação de replicação
-                    mensagem_base = f"✅ Salvo como: {resultado} {f'- {motivo_selecionado}' if motivo_selecionado else ''}"
-                    if linhas_replicadas > 0:
-                        st.success(f"{mensagem_base}\n\n🔄 **{linhas_replicadas} linha(s) duplicada(s) replicada(s) automaticamente!**")
-                    else:
-                        st.success(mensagem_base)
+                        # Feedback com informação de replicação
+                        mensagem_base = f"✅ Salvo como: {resultado} {f'- {motivo_selecionado}' if motivo_selecionado else ''}"
+                        if linhas_replicadas > 0:
+                            st.success(f"{mensagem_base}\n\n🔄 **{linhas_replicadas} linha(s) duplicada(s) replicada(s) automaticamente!**")
+                        else:
+                            st.success(mensagem_base)
                     
-                    st.rerun()
-            
-            with col_btn2:
-                if st.button('← Voltar', use_container_width=True, key=f"btn_v_{idx}"):
-                    # Voltar para a linha anterior (permite revisar validadas)
-                    if idx > 0:
-                        st.session_state.indice = idx - 1
-                        st.session_state.navegacao_manual = True
                         st.rerun()
             
-            with col_btn3:
-                if st.button('→ Pular (não salvar)', use_container_width=True, key=f"btn_p_{idx}"):
-                    st.session_state.indice = idx + 1
-                    st.session_state.navegacao_manual = False
-                    st.rerun()
+                with col_btn2:
+                    if st.button('← Voltar', use_container_width=True, key=f"btn_v_{idx}"):
+                        # Voltar para a linha anterior (permite revisar validadas)
+                        if pos > 0:
+                            st.session_state.indice = pos - 1
+                            st.session_state.navegacao_manual = True
+                            st.rerun()
+            
+                with col_btn3:
+                    if st.button('→ Pular (não salvar)', use_container_width=True, key=f"btn_p_{idx}"):
+                        st.session_state.indice = pos + 1
+                        st.session_state.navegacao_manual = False
+                        st.rerun()
+
+            st.session_state.tempo_painel_ms = (time.perf_counter() - inicio_painel) * 1000
+            metricas.registrar("painel_validacao", st.session_state.tempo_painel_ms)
+
+        painel_validacao()
 
     else:
-        st.success('🎉 Todas as imagens foram validadas!')
+        if estado.total_validadas < total and not em_equipe and fila_revisao.filtrada:
+            st.success('🎉 Todos os itens da fila filtrada foram validados!')
+            st.caption("Ainda há linhas pendentes fora do filtro.")
+        else:
+            st.success('🎉 Todas as imagens foram validadas!')
         
-        total_validas = len(df[df['Valida'] == 'SIM'])
-        total_invalidas = len(df[df['Valida'] == 'NÃO'])
+        total_validas = estado.total_sim
+        total_invalidas = estado.total_nao
         
         col_stat1, col_stat2, col_stat3 = st.columns(3)
         with col_stat1:
@@ -497,3 +951,7 @@ else:
     - Uma coluna com URLs das imagens
     - Colunas opcionais: Categoria, Data, CNPJ
     """)
+
+# Tempo do rerun completo (exibido no Debug Info do próximo rerun)
+st.session_state.tempo_rerun_ms = (time.perf_counter() - inicio_rerun) * 1000
+metricas.registrar("rerun", st.session_state.tempo_rerun_ms)
@@ -0,0 +1,196 @@
+"""Triagem em lote das URLs de um arquivo, antes da revisão humana.
+
+Uso:
+    python triagem.py dados.csv -o dados_triagem.csv --pre-marcar
+
+Baixa cada URL distinta uma vez (com concorrência limitada), anota por linha
+o status HTTP, tipo, tamanho, dimensões e erro de decodificação, e grava um
+arquivo anotado. Com --pre-marcar, as linhas claramente quebradas já saem
+como "NÃO / SEM IMAGEM", então o revisor só vê imagens que carregam. As
+imagens baixadas ficam no mesmo cache em disco usado pelo app, e seus
+hashes perceptuais entram no índice de imagens parecidas.
+
+Com --caracteristicas, as imagens que carregaram passam também pela extração
+de características em lote (caracteristicas.py, num pool de processos) e
+cada linha ganha uma sugestão de Valida/Motivo com confiança, que o app usa
+para ordenar a fila e confirmar em bloco os casos óbvios.
+"""
+import argparse
+import asyncio
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from io import BytesIO
+from urllib.parse import urlsplit
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+import caracteristicas
+from cache_imagens import DIRETORIO_PADRAO, CacheDisco
+from carregador import COLUNA_DATA, formato_data, ler_planilha, preparar_colunas
+from hash_perceptual import CAMINHO_PADRAO as HASHES_PADRAO, IndiceHashes
+import http_cliente
+from imagens import buscar_imagem, detectar_coluna_url, gerar_miniatura, normalizar_url
+
+# Situações da triagem
+OK = "OK"
+QUEBRADA = "QUEBRADA"
+TRANSITORIA = "TRANSITORIA"
+
+COLUNAS_TRIAGEM = ["Triagem", "Triagem_HTTP", "Triagem_Tipo", "Triagem_Bytes",
+                   "Triagem_Largura", "Triagem_Altura", "Triagem_Erro"]
+
+
+def url_incompleta(url):
+    """URL sem nome de arquivo, como o prefixo `.../media/` sozinho."""
+    caminho = urlsplit(url).path
+    return caminho == "" or caminho.endswith("/")
+
+
+def inspecionar(url, cache=None, timeout=10, indice_hashes=None):
+    """Baixa e decodifica a URL, retornando um dict com as colunas da triagem."""
+    if not url:
+        return {"Triagem": QUEBRADA, "Triagem_Erro": "URL vazia ou inválida"}
+    if url_incompleta(url):
+        return {"Triagem": QUEBRADA, "Triagem_Erro": "URL sem nome de arquivo"}
+
+    resposta = buscar_imagem(url, cache, timeout=timeout)
+    resultado = {
+        "Triagem_HTTP": resposta.status,
+        "Triagem_Tipo": resposta.content_type,
+        "Triagem_Bytes": len(resposta.conteudo) if resposta.conteudo is not None else None,
+    }
+    if resposta.conteudo is None:
+        # Sem resposta ou 5xx pode ser passageiro; 4xx e não-imagem não são
+        definitiva = resposta.status is not None and resposta.status < 500
+        resultado["Triagem"] = QUEBRADA if definitiva else TRANSITORIA
+        resultado["Triagem_Erro"] = resposta.erro
+        return resultado
+
+    try:
+        img = Image.open(BytesIO(resposta.conteudo))
+        resultado["Triagem_Largura"], resultado["Triagem_Altura"] = img.size
+        # Decodificação reduzida: basta para detectar arquivo truncado/corrompido
+        img.draft('RGB', (64, 64))
+        img.load()
+        resultado["Triagem"] = OK
+        if indice_hashes is not None and url not in indice_hashes:
+            # A mesma miniatura (orientação EXIF aplicada) que o app indexa, para os hashes baterem
+            indice_hashes.adicionar(url, gerar_miniatura(resposta.conteudo))
+    except Exception as e:
+        resultado["Triagem"] = QUEBRADA
+        resultado["Triagem_Erro"] = f"Erro ao decodificar: {str(e)[:100]}"
+    return resultado
+
+
+async def inspecionar_todas(urls, cache=None, concorrencia=16, timeout=10, indice_hashes=None):
+    """Inspeciona as URLs com no máximo `concorrencia` requisições simultâneas."""
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=concorrencia, thread_name_prefix="triagem"))
+    limite = asyncio.Semaphore(concorrencia)
+    resultados = {}
+
+    async def uma(url):
+        async with limite:
+            resultados[url] = await asyncio.to_thread(inspecionar, url, cache, timeout, indice_hashes)
+            feitas = len(resultados)
+            if feitas % 100 == 0 or feitas == len(urls):
+                print(f"  {feitas}/{len(urls)} URLs verificadas", file=sys.stderr)
+
+    await asyncio.gather(*(uma(url) for url in urls))
+    return resultados
+
+
+def triar(df, cache=None, concorrencia=16, timeout=10, pre_marcar=False, agrupar=False, indice_hashes=None,
+          extrair=False, processos=None):
+    """Anota o DataFrame com as colunas de triagem e retorna a cópia anotada."""
+    col_url = detectar_coluna_url(df)
+    if not col_url:
+        raise ValueError(f"Nenhuma coluna de URL encontrada. Colunas disponíveis: {df.columns.tolist()}")
+
+    df = preparar_colunas(df.copy())
+    urls = df[col_url].map(normalizar_url)
+    resultados = asyncio.run(inspecionar_todas(urls.unique().tolist(), cache, concorrencia, timeout, indice_hashes))
+    anotacoes = pd.DataFrame([resultados[url] for url in urls], index=df.index).reindex(columns=COLUNAS_TRIAGEM)
+    for col in COLUNAS_TRIAGEM:
+        df[col] = anotacoes[col]
+    for col in ("Triagem_HTTP", "Triagem_Bytes", "Triagem_Largura", "Triagem_Altura"):
+        df[col] = df[col].astype("Int64")
+
+    if extrair:
+        # Só as URLs que carregaram; os bytes vêm do cache em disco (ou de novo da rede, sem cache)
+        carregadas = [url for url, r in resultados.items() if r.get("Triagem") == OK]
+        print(f"  extraindo características de {len(carregadas)} imagens", file=sys.stderr)
+        extraidas = caracteristicas.extrair_todas(
+            carregadas, lambda url: buscar_imagem(url, cache, timeout=timeout).conteudo, processos
+        )
+        df = caracteristicas.anotar(df, urls, extraidas)
+        # Falha passageira não é "sem imagem": fica sem sugestão até a próxima triagem
+        transitorias = df["Triagem"] == TRANSITORIA
+        df.loc[transitorias, ["Sugestao_Valida", "Sugestao_Motivo"]] = ""
+        df.loc[transitorias, "Sugestao_Confianca"] = np.nan
+
+    if pre_marcar:
+        pendentes = df['Valida'].str.strip().isin(["", "nan"])
+        quebradas = pendentes & (df["Triagem"] == QUEBRADA)
+        df.loc[quebradas, ['Valida', 'Motivos', 'Data_Validacao']] = [
+            'NÃO', 'SEM IMAGEM', f"{datetime.now()} (triagem)"
+        ]
+
+    if agrupar:
+        ordem = {QUEBRADA: 0, TRANSITORIA: 1, OK: 2}
+        df = df.sort_values("Triagem", key=lambda s: s.map(ordem), kind="stable")
+    return df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Triagem em lote das URLs de imagem antes da validação.")
+    parser.add_argument("arquivo", help="CSV ou XLSX de entrada")
+    parser.add_argument("-o", "--saida", help="arquivo anotado (padrão: <entrada>_triagem.<ext>)")
+    parser.add_argument("--concorrencia", type=int, default=16, help="requisições simultâneas (padrão: 16)")
+    parser.add_argument("--timeout", type=float, default=10, help="timeout por requisição em segundos (padrão: 10)")
+    parser.add_argument("--pre-marcar", action="store_true",
+                        help="marcar linhas quebradas como NÃO / SEM IMAGEM")
+    parser.add_argument("--agrupar", action="store_true",
+                        help="ordenar a saída com as linhas quebradas primeiro")
+    parser.add_argument("--sem-cache", action="store_true", help="não usar o cache em disco de imagens")
+    parser.add_argument("--sem-hashes", action="store_true", help="não alimentar o índice de imagens parecidas")
+    parser.add_argument("--caracteristicas", action="store_true",
+                        help="extrair características das imagens e sugerir Valida/Motivo por linha")
+    parser.add_argument("--processos", type=int, default=None,
+                        help="processos da extração de características (padrão: número de CPUs)")
+    args = parser.parse_args(argv)
+    # A triagem roda sozinha no processo: pode usar toda a concorrência no mesmo host
+    http_cliente.limitador.definir_limite(args.concorrencia)
+
+    base, extensao = os.path.splitext(args.arquivo)
+    saida = args.saida or f"{base}_triagem{extensao}"
+    cache = None if args.sem_cache else CacheDisco(DIRETORIO_PADRAO)
+    indice_hashes = None if args.sem_hashes else IndiceHashes(HASHES_PADRAO)
+
+    with open(args.arquivo, "rb") as f:
+        df = ler_planilha(f, args.arquivo)
+    df = triar(df, cache, args.concorrencia, args.timeout, args.pre_marcar, args.agrupar, indice_hashes,
+               args.caracteristicas, args.processos)
+
+    if saida.endswith(".xlsx"):
+        df.to_excel(saida, index=False)
+    else:
+        df.to_csv(saida, index=False, sep=";", encoding='utf-8-sig', date_format=formato_data(df.get(COLUNA_DATA)))
+
+    contagem = df["Triagem"].value_counts()
+    print(f"{len(df)} linhas -> {saida}")
+    for situacao in (OK, TRANSITORIA, QUEBRADA):
+        print(f"  {situacao}: {int(contagem.get(situacao, 0))}")
+    if args.caracteristicas:
+        sugestoes = df.groupby(["Sugestao_Valida", "Sugestao_Motivo"]).size()
+        print("Sugestões:")
+        for (valida, motivo), qtd in sugestoes.items():
+            print(f"  {valida} {motivo or '-'}: {qtd}")
+
+
+if __name__ == "__main__":
+    main()